@@ -0,0 +1,126 @@
+# benchmarks/fake_servers.py
+# 基準測試用的本機替身：Hugging Face /predict 與 Telegram Bot API，延遲與回應內容可設定。
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BEAR_DETECTION = {"label": "kumay", "confidence": 0.93, "box": [40, 30, 200, 180]}
+
+
+class _FakeServer:
+    def __init__(self, handler):
+        self.requests = 0
+        # 依序用於接下來幾個請求的預設回應，用完後回到一般行為（測試用）
+        self.scripted = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def next_scripted(self):
+        with self._lock:
+            return self.scripted.pop(0) if self.scripted else None
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _ModelHandler(_Handler):
+    def do_POST(self):
+        fake = self.server.fake
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        fake.count()
+        scripted = fake.next_scripted()
+        time.sleep(max(0.0, random.gauss(fake.latency, fake.jitter)) if fake.jitter else fake.latency)
+        if scripted == 'truncated':
+            # 宣告的長度比實際內容長就關閉連線，用戶端會得到 ChunkedEncodingError
+            body = b'{"detections": ['
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body) + 64))
+            self.end_headers()
+            self.wfile.write(body)
+            self.close_connection = True
+            return
+        if scripted == 'error' or (fake.error_rate and random.random() < fake.error_rate):
+            self._send_json(503, {"error": "model loading"})
+            return
+        detected = fake.response == 'bear' or (fake.response == 'random' and random.random() < 0.5)
+        self._send_json(200, {"detections": [BEAR_DETECTION] if detected else []})
+
+
+class FakeModelServer(_FakeServer):
+    """
+    Hugging Face /predict 的替身，不解碼圖片以免佔用受測程序的 CPU。
+
+    response：none（永遠沒有偵測到）、bear（永遠偵測到）或 random；
+    latency / jitter 為秒數（常態分佈），error_rate 比例的請求回傳 503。
+    scripted 可放入 'error'（503）或 'truncated'（回應中途斷線），依序套用到接下來的請求。
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, response='none', error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.response = response
+        self.error_rate = error_rate
+        super().__init__(_ModelHandler)
+
+    @property
+    def predict_url(self):
+        return f"{self.url}/predict"
+
+
+class _TelegramHandler(_Handler):
+    def do_POST(self):
+        fake = self.server.fake
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        fake.count()
+        scripted = fake.next_scripted()
+        time.sleep(fake.latency)
+        if scripted is not None:
+            # (status, payload)，例如 (429, {"ok": False, "parameters": {"retry_after": 1}})
+            self._send_json(*scripted)
+            return
+        with fake._lock:
+            fake.messages.append((self.path, payload))
+        self._send_json(200, {"ok": True, "result": {}})
+
+
+class FakeTelegramServer(_FakeServer):
+    """Telegram Bot API 的替身，記錄成功收到的訊息；scripted 可放入 (status, payload) 模擬錯誤回應。"""
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.messages = []
+        super().__init__(_TelegramHandler)
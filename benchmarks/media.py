@@ -0,0 +1,41 @@
+# benchmarks/media.py
+# 產生基準測試用的合成影像與影片。
+
+import os
+
+import cv2
+import numpy as np
+
+
+def _scene(width, height, seed):
+    """帶有紋理的畫面，讓 JPEG 大小與真實照片接近，而不是一張純色圖。"""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 255, (height // 8 + 1, width // 8 + 1, 3), dtype=np.uint8)
+    return cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+def make_image(width, height, quality=92, seed=0):
+    """回傳 JPEG 位元組。"""
+    _, encoded = cv2.imencode('.jpg', _scene(width, height, seed), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
+
+
+def make_video(path, seconds, fps, width=640, height=360, seed=0):
+    """寫出 MJPG 編碼的 .avi：固定背景上有一個移動的方塊，畫面會變化但不至於每幀都完全不同。"""
+    if os.path.exists(path):
+        return path
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"無法建立影片 {path}")
+    background = _scene(width, height, seed)
+    size = max(16, height // 6)
+    try:
+        for i in range(int(seconds * fps)):
+            frame = background.copy()
+            x = int((i * 4) % max(1, width - size))
+            y = int(height / 2 + np.sin(i / fps) * height / 4) - size // 2
+            cv2.rectangle(frame, (x, y), (x + size, y + size), (30, 30, 30), -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
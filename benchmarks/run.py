@@ -0,0 +1,273 @@
+# benchmarks/run.py
+"""
+後端效能基準測試。
+
+以本機替身取代 Hugging Face 與 Telegram，用合成影像與影片量測 /api/detect、
+/api/analyze_video 與 /api/map 的吞吐量與 p50 / p95 / p99 延遲，以及冷啟動各階段的耗時
+（見 benchmarks/startup.py），結果寫成 JSON，可與先前的結果比較：
+
+    python -m benchmarks.run                                  # 全部項目
+    python -m benchmarks.run --suites detect,map --model-latency 0.1
+    python -m benchmarks.run --baseline benchmarks/results/baseline.json --fail-on-regression
+
+請求透過 Flask test client 在同一個程序中送出，量到的是應用程式本身（含呼叫替身伺服器）的時間，
+不含 WSGI 伺服器與網路的額外開銷。
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.fake_servers import FakeModelServer, FakeTelegramServer
+from benchmarks.media import make_image, make_video
+from benchmarks.startup import bench_startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+SUITES = ('startup', 'detect', 'video', 'map')
+
+# (名稱, 寬, 高)
+DETECT_IMAGES = [('640x480', 640, 480), ('4000x3000', 4000, 3000)]
+DETECT_CONCURRENCY = [1, 8]
+# (秒數, fps)；解析度固定為 640x360
+VIDEO_CASES = [(10, 10), (30, 30), (120, 30)]
+# (名稱, 查詢參數)；資料期間為 2015-11 至 2020-12
+MAP_CASES = [
+    ('all', {}),
+    ('1y', {'start': '2019-09-01', 'end': '2020-08-31'}),
+    ('1m', {'start': '2020-01-01', 'end': '2020-01-31'}),
+    ('all_columnar', {'format': 'columnar'}),
+    ('clusters_z8', {'zoom': '8'}),
+    ('density', {'_path': '/api/map/density', 'cell': '0.05'}),
+]
+
+
+def summarize(latencies, wall_seconds, **extra):
+    values = np.array(latencies) * 1000
+    return {
+        'n': len(values),
+        'throughput_rps': round(len(values) / wall_seconds, 3) if wall_seconds else None,
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'min_ms': round(float(values.min()), 3),
+        'max_ms': round(float(values.max()), 3),
+        **extra,
+    }
+
+
+def measure(request_fn, iterations, concurrency=1, warmup=1):
+    """執行 iterations 次 request_fn（最多 concurrency 個同時進行），回傳每次的延遲與總耗時。"""
+    for _ in range(warmup):
+        request_fn()
+
+    def timed(_):
+        started = time.perf_counter()
+        request_fn()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        latencies = [timed(i) for i in range(iterations)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(timed, range(iterations)))
+    return latencies, time.perf_counter() - started
+
+
+def _check(response):
+    if response.status_code not in (200, 304):
+        raise RuntimeError(f"{response.request.path} 回應 {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def bench_detect(client, args):
+    results = {}
+    for name, width, height in DETECT_IMAGES:
+        image = make_image(width, height)
+        for response_image in ('full', 'none'):
+            for concurrency in DETECT_CONCURRENCY:
+                def request_fn():
+                    _check(client.post('/api/detect', data={
+                        'image': (io.BytesIO(image), 'bench.jpg'), 'response_image': response_image,
+                    }))
+                latencies, wall = measure(request_fn, args.iterations, concurrency)
+                key = f"detect/{name}/{response_image}/c{concurrency}"
+                results[key] = summarize(latencies, wall, image_bytes=len(image))
+                print(f"{key}: p50 {results[key]['p50_ms']} ms, {results[key]['throughput_rps']} req/s")
+    return results
+
+
+def bench_video(client, args, workdir):
+    results = {}
+    for seconds, fps in VIDEO_CASES:
+        path = make_video(os.path.join(workdir, f"bench_{seconds}s_{fps}fps.avi"), seconds, fps)
+
+        def request_fn():
+            with open(path, 'rb') as video:
+                _check(client.post('/api/analyze_video', data={'video': (video, 'bench.avi')}))
+        latencies, wall = measure(request_fn, args.video_iterations, warmup=0)
+        key = f"analyze_video/{seconds}s/{fps}fps"
+        results[key] = summarize(
+            latencies, wall,
+            video_seconds=seconds,
+            video_seconds_per_second=round(seconds * len(latencies) / sum(latencies), 3),
+        )
+        print(f"{key}: p50 {results[key]['p50_ms']} ms ({results[key]['video_seconds_per_second']}x realtime)")
+    return results
+
+
+def bench_map(client, args):
+    results = {}
+    for name, params in MAP_CASES:
+        params = dict(params)
+        path = params.pop('_path', '/api/map')
+        latencies, wall = measure(lambda: _check(client.get(path, query_string=params)), args.iterations)
+        key = f"map/{name}"
+        response = client.get(path, query_string=params)
+        results[key] = summarize(latencies, wall, response_bytes=len(response.data))
+
+        # 前端帶著 ETag 重新整理時的 304 路徑
+        etag = response.headers.get('ETag')
+        if etag:
+            latencies, wall = measure(
+                lambda: _check(client.get(path, query_string=params, headers={'If-None-Match': etag})), args.iterations
+            )
+            results[f"{key}/304"] = summarize(latencies, wall)
+        print(f"{key}: p50 {results[key]['p50_ms']} ms, {results[key]['response_bytes']} bytes")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """列出 p50 / p95 與基準結果的差異；回傳變慢超過 threshold 的項目。"""
+    regressions = []
+    print(f"\n{'case':<45} {'p50 ms':>10} {'base':>10} {'Δ%':>8} {'p95 ms':>10} {'base':>10} {'Δ%':>8}")
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            print(f"{key:<45} {current['p50_ms']:>10} {'-':>10} {'new':>8}")
+            continue
+        row = [key]
+        for metric in ('p50_ms', 'p95_ms'):
+            delta = (current[metric] - base[metric]) / base[metric] if base[metric] else 0.0
+            row += [current[metric], base[metric], f"{delta:+.1%}"]
+            if delta > threshold:
+                regressions.append((key, metric, delta))
+        print(f"{row[0]:<45} {row[1]:>10} {row[2]:>10} {row[3]:>8} {row[4]:>10} {row[5]:>10} {row[6]:>8}")
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suites', default=','.join(SUITES), help="要執行的項目（逗號分隔）：startup,detect,video,map")
+    parser.add_argument('--iterations', type=int, default=30, help="detect 與 map 每個案例的請求數")
+    parser.add_argument('--video-iterations', type=int, default=3, help="analyze_video 每個案例的請求數")
+    parser.add_argument('--startup-iterations', type=int, default=5, help="冷啟動量測次數（每次一個新的程序）")
+    parser.add_argument('--model-latency', type=float, default=0.05, help="模型替身的回應延遲（秒）")
+    parser.add_argument('--model-jitter', type=float, default=0.0, help="模型替身延遲的標準差（秒）")
+    parser.add_argument('--model-response', choices=('none', 'bear', 'random'), default='none')
+    parser.add_argument('--telegram-latency', type=float, default=0.2, help="Telegram 替身的回應延遲（秒）")
+    parser.add_argument('--cache', action='store_true', help="啟用偵測結果快取（預設關閉，每個請求都呼叫模型）")
+    parser.add_argument('--output', help="結果 JSON 路徑（預設 benchmarks/results/<時間>.json）")
+    parser.add_argument('--baseline', help="要比較的基準結果 JSON")
+    parser.add_argument('--threshold', type=float, default=0.10, help="p50 / p95 變慢超過此比例視為退步")
+    parser.add_argument('--fail-on-regression', action='store_true', help="有退步時以結束碼 1 結束")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    suites = [s.strip() for s in args.suites.split(',') if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        sys.exit(f"未知的項目: {', '.join(sorted(unknown))}")
+
+    model = FakeModelServer(args.model_latency, args.model_jitter, args.model_response).start()
+    telegram = FakeTelegramServer(args.telegram_latency).start()
+    workdir = tempfile.mkdtemp(prefix='bear-bench-')
+
+    # 必須在匯入 app 之前設定，讓 app 連到替身伺服器並使用暫存資料庫
+    os.environ.update({
+        'HF_API_URL': model.predict_url,
+        'HF_API_TOKEN': 'benchmark',
+        'DETECTOR_BACKENDS': 'hf',
+        'TELEGRAM_BOT_TOKEN': 'benchmark',
+        'TELEGRAM_CHAT_ID': '1',
+        'TELEGRAM_API_BASE': telegram.url,
+        'DETECTION_CACHE_ENABLED': '1' if args.cache else '0',
+        'DATABASE_PATH': os.path.join(workdir, 'bench.db'),
+        'VIDEO_JOB_DIR': os.path.join(workdir, 'video_jobs'),
+    })
+    sys.path.insert(0, ROOT)
+    import src.main as backend
+    client = backend.create_app(warm_start=False).test_client()
+
+    results = {}
+    try:
+        if 'startup' in suites:
+            results.update(bench_startup(args, summarize))
+        if 'detect' in suites:
+            results.update(bench_detect(client, args))
+        if 'video' in suites:
+            results.update(bench_video(client, args, workdir))
+        if 'map' in suites:
+            results.update(bench_map(client, args))
+    finally:
+        # 先送完排隊中的警報再關閉替身伺服器
+        backend.get_alert_dispatcher().shutdown()
+        model.stop()
+        telegram.stop()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'settings': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+            'model_requests': model.requests,
+            'telegram_messages': len(telegram.messages),
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n結果已寫入 {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 項變慢超過 {args.threshold:.0%}:")
+            for key, metric, delta in regressions:
+                print(f"  {key} {metric} {delta:+.1%}")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+# benchmarks/startup.py
+"""
+冷啟動時間量測。
+
+每次都在新的 Python 程序中（python -X importtime）依序執行：匯入 src.main、create_app()、
+第一個請求（/api/detection/health）與第一個地圖請求（/api/map，含載入 CSV），
+回報各階段耗時與各模組的匯入成本：
+
+    python -m benchmarks.startup                     # 5 次，列出各階段最耗時的模組
+    python -m benchmarks.startup --iterations 10 --top 20
+    python -m benchmarks.run --suites startup        # 與其他項目一起寫入結果 JSON、與基準比較
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ('import', 'create_app', 'first_request', 'first_map')
+# 子程序在 stderr 標記階段結束，之前的 importtime 紀錄都算在該階段
+_PHASE_MARKER = '#startup-phase '
+_RESULT_MARKER = '#startup-result '
+
+
+def _mark_phase(name):
+    # 直接寫入檔案描述符，標記才不會與直譯器寫出的 importtime 紀錄交錯在同一行
+    sys.stderr.flush()
+    os.write(sys.stderr.fileno(), f"{_PHASE_MARKER}{name}\n".encode())
+
+
+def _child():
+    timings = {}
+
+    def phase(name, started):
+        timings[name] = time.perf_counter() - started
+        _mark_phase(name)
+
+    # 量測程式本身的匯入不算在應用程式的啟動成本內
+    _mark_phase('harness')
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import src.main as backend
+    phase('import', started)
+
+    started = time.perf_counter()
+    app = backend.create_app(warm_start=False)
+    phase('create_app', started)
+
+    client = app.test_client()
+    started = time.perf_counter()
+    client.get('/api/detection/health')
+    phase('first_request', started)
+
+    started = time.perf_counter()
+    client.get('/api/map', query_string={'format': 'columnar'})
+    phase('first_map', started)
+    print(_RESULT_MARKER + json.dumps(timings), flush=True)
+
+
+def _package(module):
+    """第三方套件以最上層名稱彙總，專案自己的模組逐一列出。"""
+    return module if module.startswith(('src.', 'benchmarks.')) else module.split('.')[0]
+
+
+def parse_importtime(stderr):
+    """把 -X importtime 的輸出依階段彙總成 {phase: {package: 自身耗時秒數}}。"""
+    costs = {}
+    current = {}
+    for line in stderr.splitlines():
+        if line.startswith(_PHASE_MARKER):
+            costs[line[len(_PHASE_MARKER):].strip()] = current
+            current = {}
+            continue
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        package = _package(module.strip())
+        current[package] = current.get(package, 0.0) + int(self_us) / 1e6
+    return costs
+
+
+def run_once(env):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'benchmarks.startup', '--child'],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    lines = [line for line in result.stdout.splitlines() if line.startswith(_RESULT_MARKER)]
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(f"啟動量測失敗（結束碼 {result.returncode}）:\n{result.stderr[-2000:]}")
+    return json.loads(lines[-1][len(_RESULT_MARKER):]), parse_importtime(result.stderr)
+
+
+def measure_startup(iterations=5, top=15, workdir=None):
+    """
+    回傳 (phase_seconds, module_costs)：每個階段各次的耗時，以及每個階段中匯入成本最高的 top 個模組
+    （各次的中位數，毫秒）。第一次執行只用來暖磁碟快取，不列入結果。
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix='bear-startup-')
+    env = dict(os.environ, DATABASE_PATH=os.path.join(workdir, 'startup.db'), STREAM_MONITOR_SOURCES='')
+    run_once(env)
+    phase_seconds = {phase: [] for phase in PHASES}
+    per_run_costs = []
+    for _ in range(iterations):
+        timings, costs = run_once(env)
+        for phase in PHASES:
+            phase_seconds[phase].append(timings[phase])
+        per_run_costs.append(costs)
+
+    module_costs = {}
+    for phase in PHASES:
+        packages = {package for costs in per_run_costs for package in costs.get(phase, {})}
+        medians = {
+            package: statistics.median(costs.get(phase, {}).get(package, 0.0) for costs in per_run_costs) * 1000
+            for package in packages
+        }
+        ranked = sorted(medians.items(), key=lambda item: item[1], reverse=True)[:top]
+        module_costs[phase] = {package: round(ms, 2) for package, ms in ranked}
+    return phase_seconds, module_costs
+
+
+def bench_startup(args, summarize):
+    """benchmarks.run 的 startup 項目；summarize 為 run.py 的統計函式。"""
+    phase_seconds, module_costs = measure_startup(args.startup_iterations)
+    results = {}
+    for phase in PHASES:
+        key = f"startup/{phase}"
+        results[key] = summarize(phase_seconds[phase], None, modules=module_costs[phase])
+        print(f"{key}: p50 {results[key]['p50_ms']} ms")
+    to_first_request = [sum(values) for values in zip(*(phase_seconds[p] for p in PHASES[:3]))]
+    results['startup/time_to_first_request'] = summarize(to_first_request, None)
+    print(f"startup/time_to_first_request: p50 {results['startup/time_to_first_request']['p50_ms']} ms")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=5, help="量測次數（每次一個新的程序）")
+    parser.add_argument('--top', type=int, default=15, help="每個階段列出幾個最耗時的模組")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _child()
+        return
+
+    phase_seconds, module_costs = measure_startup(args.iterations, args.top)
+    for phase in PHASES:
+        print(f"\n{phase}: p50 {statistics.median(phase_seconds[phase]) * 1000:.1f} ms")
+        for package, ms in module_costs[phase].items():
+            print(f"  {package:<45} {ms:>9.2f} ms")
+    total = [sum(values) for values in zip(*(phase_seconds[p] for p in PHASES[:3]))]
+    print(f"\ntime to first request: p50 {statistics.median(total) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
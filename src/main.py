@@ -1,134 +1,274 @@
 # src/main.py (Final Corrected Version)
+#
+# 以 create_app() 建立應用程式：
+#   python -m src.main                    # 單一程序，開始監聽後才在背景載入地圖資料（python src/main.py 亦可）
+#   gunicorn "src.main:create_app()"      # 也可沿用 src.main:app
+#   flask --app src.main video-workers    # 搭配 gunicorn 時另外執行，處理非同步影片分析工作
+# 模組層級只匯入輕量的套件；pandas / numpy（地圖）、cv2（影片、串流、ONNX）與 PIL（圖片前處理）
+# 由需要的路由在第一次使用時才匯入。啟動各階段與各模組的匯入耗時可用 python -m benchmarks.startup 量測。
 
 import traceback
+import json
+import atexit
+import zipfile
+import threading
+import time
 import requests
-import io
 import base64
 import os
-import pandas as pd
-import folium
-import cv2
-import numpy as np
-import tempfile
-from flask import Flask, request, jsonify
+import sys
+import click
+from flask import Blueprint, Flask, request, jsonify, Response, g, stream_with_context
 from flask_cors import CORS
-from PIL import Image
-from folium.plugins import MarkerCluster
 from datetime import datetime
 from flask_caching import Cache
 
+# 以 python src/main.py 直接執行時 sys.path 只有 src/，補上專案根目錄，下面 src.* 的匯入才找得到
+if not __package__:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.detection_cache import DetectionCache
+from src.services.inference_client import (
+    CircuitBreaker, CircuitOpenError, InferenceError, configure_inference_client, is_bear_detected
+)
+from src.services.detectors import HuggingFaceDetector, configure_detector
+from src.services.uploads import remove_temp, save_stream, save_upload
+from src.services.metrics import (
+    REGISTRY, finish_request_timings, render_metrics, server_timing_header, start_request_timings, timed
+)
+from src.services.alerts import DEFAULT_TELEGRAM_API_BASE, AlertDispatcher, TelegramBot
+from src.services.batch_detection import detect_concurrently, iter_saved_images, iter_zip_images, save_uploaded_images
+from src.services.video_jobs import JobQueueFull, VideoJobPool, submit_job, upgrade_schema
+from src.models.video_job import VideoJob
+from src.models.user import db
+from src.routes.detection import detection_bp
+from src.routes.user import user_bp
+
 # --- 1. 集中讀取所有環境變數 ---
 # Telegram
 TELEGRAM_BOT_TOKEN= os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TELEGRAM_API_BASE = os.getenv('TELEGRAM_API_BASE', DEFAULT_TELEGRAM_API_BASE)
+# 同一來源在此秒數內的後續警報合併成一則摘要（0 表示每則都發送）；Telegram 每分鐘發送上限與重試次數
+ALERT_COALESCE_WINDOW_SECONDS = float(os.getenv('ALERT_COALESCE_WINDOW_SECONDS', '30'))
+TELEGRAM_RATE_PER_MINUTE = int(os.getenv('TELEGRAM_RATE_PER_MINUTE', '20'))
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', '3'))
 # Hugging Face
 HF_API_URL = os.getenv("HF_API_URL", "https://ladyzoe-bear-detector-api-docker.hf.space/predict")
 HF_API_TOKEN = os.getenv("HF_API_TOKEN")
-
-# --- Telegram Bot 類別定義 ---
-class TelegramBot:
-    def __init__(self, bot_token, chat_id):
-        if not bot_token or not chat_id:
-            print("Warning: Telegram Bot token or chat_id is missing. Notifications will be disabled.")
-            self.bot_token = None
-            self.chat_id = None
-        else:
-            self.bot_token = bot_token
-            self.chat_id = chat_id
-            self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
-
-    def send_message(self, message):
-        if not self.bot_token: return
-        url = f"{self.base_url}/sendMessage"
-        data = {"chat_id": self.chat_id, "text": message, "parse_mode": "HTML"}
-        try:
-            response = requests.post(url, json=data)
-            response.raise_for_status()
-            print("Telegram message sent successfully.")
-        except Exception as e:
-            print(f"發送 Telegram 訊息錯誤: {e}")
-
-    def send_photo(self, photo_url, caption=""):
-        if not self.bot_token: return
-        url = f"{self.base_url}/sendPhoto"
-        data = {"chat_id": self.chat_id, "photo": photo_url, "caption": caption, "parse_mode": "HTML"}
-        try:
-            response = requests.post(url, json=data)
-            response.raise_for_status()
-            print("Telegram photo sent successfully.")
-        except Exception as e:
-            print(f"發送 Telegram 圖片錯誤: {e}")
-
-telegram_bot = TelegramBot(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
-
-# --- 通知發送的共用函式 ---
-def send_bear_alert(confidence, image_url=None, location=None):
+HF_CONNECT_TIMEOUT = float(os.getenv("HF_CONNECT_TIMEOUT", "5"))
+HF_READ_TIMEOUT = float(os.getenv("HF_READ_TIMEOUT", "60"))
+HF_MAX_RETRIES = int(os.getenv("HF_MAX_RETRIES", "2"))
+# 連續失敗幾次後暫停呼叫模型服務，以及暫停多久後再試探
+HF_CIRCUIT_FAILURES = int(os.getenv("HF_CIRCUIT_FAILURES", "5"))
+HF_CIRCUIT_RESET_SECONDS = float(os.getenv("HF_CIRCUIT_RESET_SECONDS", "30"))
+# 偵測後端的嘗試順序（hf：Hugging Face API；onnx：本機 CPU 上的 ONNX 模型），例如 "onnx,hf"
+DETECTOR_BACKENDS = [name.strip() for name in os.getenv("DETECTOR_BACKENDS", "hf").split(",") if name.strip()]
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH")
+ONNX_LABELS = [label.strip() for label in os.getenv("ONNX_LABELS", "kumay").split(",")]
+ONNX_INPUT_SIZE = int(os.getenv("ONNX_INPUT_SIZE", "640"))
+ONNX_CONFIDENCE_THRESHOLD = float(os.getenv("ONNX_CONFIDENCE_THRESHOLD", "0.25"))
+# 同時進行的影片幀推論會合併成一次前向運算，最多幾張
+ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", "8"))
+# 偵測結果快取；近似重複比對預設關閉（0），開啟時為 dHash 的漢明距離門檻
+DETECTION_CACHE_ENABLED = os.getenv("DETECTION_CACHE_ENABLED", "1") == "1"
+DETECTION_CACHE_MAX_ENTRIES = int(os.getenv("DETECTION_CACHE_MAX_ENTRIES", "1024"))
+DETECTION_CACHE_MAX_MB = float(os.getenv("DETECTION_CACHE_MAX_MB", "16"))
+DETECTION_CACHE_TTL = int(os.getenv("DETECTION_CACHE_TTL", "3600"))
+DETECTION_CACHE_NEAR_DUPLICATE_DISTANCE = int(os.getenv("DETECTION_CACHE_NEAR_DUPLICATE_DISTANCE", "0"))
+# 圖片偵測達到此信心度才發送警報
+ALERT_CONFIDENCE_THRESHOLD = 0.7
+# 批次圖片偵測：預設並行數與單次上限
+DETECT_BATCH_CONCURRENCY = int(os.getenv("DETECT_BATCH_CONCURRENCY", "8"))
+DETECT_BATCH_MAX_IMAGES = int(os.getenv("DETECT_BATCH_MAX_IMAGES", "1000"))
+# zip 內單張圖片解壓後的大小上限；超過的項目略過
+DETECT_BATCH_MAX_IMAGE_MB = float(os.getenv("DETECT_BATCH_MAX_IMAGE_MB", "20"))
+# 影片分析時同時進行的推論請求數
+VIDEO_INFERENCE_WORKERS = int(os.getenv("VIDEO_INFERENCE_WORKERS", "4"))
+MAX_VIDEO_INFERENCE_WORKERS = 16
+# 抽樣幀與上一個抽樣幀（64x36 縮圖）的最大像素差低於此值時沿用上一個結果；預設 0 停用，
+# 每個抽樣幀都推論，結果與逐幀處理完全相同
+VIDEO_MOTION_THRESHOLD = float(os.getenv("VIDEO_MOTION_THRESHOLD", "0"))
+# 自適應抽樣的粗掃描間隔（秒）；未設定時等於警報門檻秒數，確保不會漏掉達到門檻的連續偵測
+VIDEO_COARSE_INTERVAL_SECONDS = os.getenv("VIDEO_COARSE_INTERVAL_SECONDS")
+# 非同步影片分析：worker 程序數、排隊上限與上傳影片的存放目錄
+VIDEO_JOB_WORKERS = int(os.getenv("VIDEO_JOB_WORKERS", "2"))
+VIDEO_JOB_QUEUE_LIMIT = int(os.getenv("VIDEO_JOB_QUEUE_LIMIT", "20"))
+VIDEO_JOB_DIR = os.getenv("VIDEO_JOB_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'video_jobs'))
+# 設為 1 時由 create_app 啟動 worker 程序。每個節點只能有一個程序開啟（gunicorn 多個 worker 時
+# 每個都會各自啟動一組），否則改以 flask video-workers 另外執行
+VIDEO_JOBS_IN_APP = os.getenv("VIDEO_JOBS_IN_APP", "0") == "1"
+# 串流監控："name=url;name2=url2"（RTSP/HTTP URL 或本機檔案）、每秒抽樣幀數與共用的推論執行緒數
+STREAM_MONITOR_SOURCES = os.getenv("STREAM_MONITOR_SOURCES")
+STREAM_MONITOR_FPS = float(os.getenv("STREAM_MONITOR_FPS", "1"))
+STREAM_MONITOR_WORKERS = int(os.getenv("STREAM_MONITOR_WORKERS", "8"))
+# 以 gunicorn 等 WSGI 伺服器啟動（src.main:create_app()）時，設為 1 才會在 create_app 中啟動串流監控；
+# 每個 worker 程序都會各自監控一次，只應在單一 worker（-w 1）的程序中開啟
+STREAM_MONITOR_IN_APP = os.getenv("STREAM_MONITOR_IN_APP", "0") == "1"
+# 地圖資料；未設定時使用內附的 CSV
+SIGHTINGS_CSV_PATH = os.getenv("SIGHTINGS_CSV_PATH")
+# memory：每個程序各自載入 CSV；sqlite：點位查詢改走資料庫中的 R*Tree 索引
+SIGHTINGS_BACKEND = os.getenv("SIGHTINGS_BACKEND", "memory")
+# 在回應中加上 Server-Timing 標頭，列出本次請求各處理階段的耗時
+METRICS_TIMING_HEADER = os.getenv("METRICS_TIMING_HEADER", "0") == "1"
+# 資料庫
+DATABASE_PATH = os.getenv("DATABASE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'app.db'))
+DATABASE_URI = f"sqlite:///{DATABASE_PATH}"
+
+# --- Telegram 警報 ---
+# 第一次發送警報時才建立 Telegram 連線與背景派送器
+telegram_bot = None
+alert_dispatcher = None
+alert_dispatcher_lock = threading.Lock()
+
+def deliver_bear_alert(alert):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if alert.coalesced:
+        # 時間窗內合併的後續警報
+        count_line = f"📸 <b>過去 {alert.window_seconds:g} 秒內另有 {alert.detection_count} 次偵測</b>\n"
+    elif alert.detection_count:
+        # 批次偵測時彙整成一則訊息，註明共有幾張影像偵測到黑熊
+        count_line = f"📸 <b>共 {alert.detection_count} 張影像偵測到黑熊</b>\n"
+    else:
+        count_line = ""
     alert_message = (
         f"🐻 <b>黑熊預警系統</b> 🚨\n\n"
         f"⚠️ <b>偵測到疑似黑熊！</b>\n"
-        f"🎯 <b>信心度：{confidence:.2%}</b>\n"
+        f"🎯 <b>{'最高' if alert.coalesced else ''}信心度：{alert.confidence:.2%}</b>\n"
+        f"{count_line}"
         f" <b>\n請立即採取適當的安全措施！</b>\n"
     )
 
-    if image_url:
-        telegram_bot.send_photo(image_url, alert_message)
+    if alert.image_url:
+        telegram_bot.send_photo(alert.image_url, alert_message)
     else:
         telegram_bot.send_message(alert_message)
 
-# --- Flask App 初始化與設定 ---
-app = Flask(__name__)
-# 允許來自 Render 前端和本地測試伺服器的請求
-CORS(app, origins=["https://bear-detection-app.onrender.com", "http://localhost:5173"])
-# 初始化快取
+def get_alert_dispatcher():
+    global telegram_bot, alert_dispatcher
+    with alert_dispatcher_lock:
+        if alert_dispatcher is None:
+            telegram_bot = TelegramBot(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, api_base=TELEGRAM_API_BASE)
+            alert_dispatcher = AlertDispatcher(
+                deliver_bear_alert,
+                window=ALERT_COALESCE_WINDOW_SECONDS,
+                rate_per_minute=TELEGRAM_RATE_PER_MINUTE,
+                max_retries=TELEGRAM_MAX_RETRIES,
+            )
+            atexit.register(alert_dispatcher.shutdown)
+    return alert_dispatcher
+
+# --- 通知發送的共用函式 ---
+def send_bear_alert(confidence, image_url=None, location=None, detection_count=None):
+    """排入背景派送器後立即返回；同一個 location 短時間內的警報會合併成一則。"""
+    if not TELEGRAM_BOT_TOKEN:
+        return
+    get_alert_dispatcher().submit(
+        location or "系統偵測區域", confidence, image_url=image_url, detection_count=detection_count
+    )
+
+# 快取在 create_app() 中綁定到 app
 cache = Cache(config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 3600})
-cache.init_app(app)
 
 # --- 偵測相關的共用函式 ---
+# /api/detect、影片分析與 detection_bp 共用同一個推論用戶端（連線池與斷路器）
+inference_client = configure_inference_client(
+    api_url=HF_API_URL,
+    api_token=HF_API_TOKEN,
+    connect_timeout=HF_CONNECT_TIMEOUT,
+    read_timeout=HF_READ_TIMEOUT,
+    max_retries=HF_MAX_RETRIES,
+    pool_size=MAX_VIDEO_INFERENCE_WORKERS,
+    breaker=CircuitBreaker(HF_CIRCUIT_FAILURES, HF_CIRCUIT_RESET_SECONDS),
+    cache=DetectionCache(
+        max_entries=DETECTION_CACHE_MAX_ENTRIES,
+        max_bytes=int(DETECTION_CACHE_MAX_MB * 1024 * 1024),
+        ttl=DETECTION_CACHE_TTL,
+        near_duplicate_distance=DETECTION_CACHE_NEAR_DUPLICATE_DISTANCE,
+    ) if DETECTION_CACHE_ENABLED else None,
+)
+
+def build_detector_backends(names):
+    backends = []
+    for name in names:
+        if name == 'hf':
+            if not HF_API_TOKEN:
+                print("Error: Hugging Face API Token (HF_API_TOKEN) is not set.")
+            backends.append(HuggingFaceDetector(inference_client))
+        elif name == 'onnx':
+            if not ONNX_MODEL_PATH:
+                print("Warning: ONNX_MODEL_PATH is not set. Local ONNX detector disabled.")
+                continue
+            # cv2 只在啟用 ONNX 後端時載入
+            from src.services.onnx_detector import OnnxDetector
+            backends.append(OnnxDetector(
+                ONNX_MODEL_PATH,
+                labels=ONNX_LABELS,
+                input_size=ONNX_INPUT_SIZE,
+                confidence_threshold=ONNX_CONFIDENCE_THRESHOLD,
+                batch_size=ONNX_BATCH_SIZE,
+            ))
+        else:
+            print(f"Warning: 未知的偵測後端 {name}，已略過")
+    return backends
+
+# 依 DETECTOR_BACKENDS 的順序嘗試，前一個無法使用或失敗時自動改用下一個
+detector = configure_detector(build_detector_backends(DETECTOR_BACKENDS))
+
 def detect_objects_in_image_data(image_bytes):
-    if not HF_API_TOKEN:
-        print("Error: Hugging Face API Token (HF_API_TOKEN) is not set.")
-        return None
     try:
-        headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
-        safe_filename = "upload.jpg"
-        hf_files = {'file': (safe_filename, image_bytes, 'image/jpeg')}
-        hf_response = requests.post(HF_API_URL, headers=headers, files=hf_files)
-        hf_response.raise_for_status()
-        return hf_response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Hugging Face API request failed: {e}")
+        return detector.detect(image_bytes)
+    except CircuitOpenError as e:
+        print(f"Hugging Face API skipped: {e}")
+        return None
+    except (InferenceError, requests.exceptions.RequestException) as e:
+        print(f"Detection request failed: {e}")
         return None
 
-def is_bear_detected(api_response):
-    if api_response and isinstance(api_response.get('detections'), list):
-        bear_detections = [item for item in api_response['detections'] if isinstance(item, dict) and item.get('label') == 'kumay']
-        if bear_detections:
-            highest_confidence = max(item.get('confidence', 0) for item in bear_detections)
-            return True, highest_confidence
-    return False, 0.0
+def detect_uploaded_image(image_bytes):
+    # 上傳的照片先修正方向並縮到模型輸入尺寸，再送去推論
+    from src.services.image_preprocess import prepare_image
+    return detect_objects_in_image_data(prepare_image(image_bytes).data)
+
+def classify_frame(image_bytes):
+    return is_bear_detected(detect_objects_in_image_data(image_bytes))
 
 # --- API 端點 ---
+# 主要的 API 路由；detection_bp / user_bp 與本藍圖都在 create_app() 中註冊
+api_bp = Blueprint('api', __name__, cli_group=None)
 
 # 圖片偵測 API
-@app.route('/api/detect', methods=['POST'])
+@api_bp.route('/api/detect', methods=['POST'])
 def detect_bear_image():
-    if 'image' not in request.files:
+    # 圖片前處理（PIL）在第一次偵測時才載入
+    from src.services.image_preprocess import annotated_thumbnail, prepare_image
+
+    with timed('upload'):
+        files = request.files
+    if 'image' not in files:
         return jsonify({"success": False, "error": "沒有上傳圖片檔案"}), 400
-    file = request.files['image']
+    file = files['image']
     if file.filename == '':
         return jsonify({"success": False, "error": "沒有選擇檔案"}), 400
 
+    # full：回傳原圖（預設，與舊版前端相容）；thumbnail：回傳畫上偵測框的小縮圖；none：不回傳圖片
+    response_image = request.values.get('response_image', 'full')
+    if response_image not in ('full', 'thumbnail', 'none'):
+        return jsonify({"success": False, "error": "response_image 必須是 full、thumbnail 或 none"}), 400
+
     try:
         image_bytes = file.read()
-        api_response = detect_objects_in_image_data(image_bytes)
+        prepared = prepare_image(image_bytes)
+        upload_started = time.perf_counter()
+        api_response = detect_objects_in_image_data(prepared.data)
+        upload_ms = round((time.perf_counter() - upload_started) * 1000, 2)
         
         if not api_response:
              return jsonify({"success": False, "error": "模型偵測失敗，請檢查後端日誌"}), 500
 
         bear_is_detected, confidence = is_bear_detected(api_response)
         alert_sent = False
-        if bear_is_detected and confidence >= 0.7:
+        if bear_is_detected and confidence >= ALERT_CONFIDENCE_THRESHOLD:
             print("Image detection: Bear detected! Sending Telegram alert...")
             send_bear_alert(confidence=confidence, image_url=None, location="系統偵測區域")
             alert_sent = True
@@ -137,9 +277,14 @@ def detect_bear_image():
             "success": True,
             "bear_detected": bear_is_detected,
             "confidence": confidence,
-            "processed_image": base64.b64encode(image_bytes).decode('utf-8'),
-            "alert_sent": alert_sent
+            "alert_sent": alert_sent,
+            "bytes_saved": prepared.bytes_saved,
+            "timings": {"encode_ms": prepared.encode_ms, "upload_ms": upload_ms}
         }
+        if response_image == 'full':
+            response_data["processed_image"] = base64.b64encode(image_bytes).decode('utf-8')
+        elif response_image == 'thumbnail':
+            response_data["thumbnail"] = annotated_thumbnail(prepared, api_response.get('detections'))
         return jsonify(response_data)
         
     except Exception as e:
@@ -147,122 +292,420 @@ def detect_bear_image():
         traceback.print_exc()
         return jsonify({"success": False, "error": "伺服器處理圖片時發生錯誤"}), 500
 
-# ✅【修正一】影片分析 API，改回即時觸發警報的邏輯
-@app.route('/api/analyze_video', methods=['POST'])
-def analyze_video():
-    if 'video' not in request.files:
-        return jsonify({"success": False, "error": "沒有上傳影片檔案"}), 400
-    video_file = request.files['video']
-    if video_file.filename == '':
-        return jsonify({"success": False, "error": "沒有選擇檔案"}), 400
+def ndjson_response(events, cleanup, error_message):
+    """
+    把事件逐行輸出成 NDJSON 串流回應；回應關閉時（串流結束或用戶端斷線）關閉事件產生器並執行 cleanup。
+
+    清理不能放在產生器的 finally：用戶端在第一行送出前就斷線時，產生器根本還沒開始執行。
+    """
+    def lines():
+        try:
+            for event in events:
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Exception as e:
+            traceback.print_exc()
+            yield json.dumps({"event": "error", "error": f"{error_message}: {e}"}, ensure_ascii=False) + "\n"
+
+    response = Response(
+        stream_with_context(lines()),
+        mimetype='application/x-ndjson',
+        headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'},
+    )
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp:
-        temp.write(video_file.read())
-        temp_video_path = temp.name
+    @response.call_on_close
+    def close():
+        events.close()
+        cleanup()
+
+    return response
+
+def batch_detection_events(images, concurrency):
+    """依完成順序產生每張影像的結果，最後產生彙總並只發送一則警報。"""
+    total = 0
+    bear_count = 0
+    max_confidence = 0.0
+    for index, filename, api_response, error in detect_concurrently(
+        images, detect_uploaded_image, concurrency, max_images=DETECT_BATCH_MAX_IMAGES
+    ):
+        total += 1
+        if error is not None or not api_response:
+            yield {"event": "image", "index": index, "filename": filename, "success": False, "error": "模型偵測失敗"}
+            continue
+        bear_is_detected, confidence = is_bear_detected(api_response)
+        if bear_is_detected and confidence >= ALERT_CONFIDENCE_THRESHOLD:
+            bear_count += 1
+            max_confidence = max(max_confidence, confidence)
+        yield {
+            "event": "image",
+            "index": index,
+            "filename": filename,
+            "success": True,
+            "bear_detected": bear_is_detected,
+            "confidence": confidence
+        }
 
-    cap = None
+    alert_sent = False
+    if bear_count:
+        print(f"Batch detection: {bear_count} image(s) with bears. Sending one Telegram alert...")
+        send_bear_alert(confidence=max_confidence, image_url=None, location="批次影像偵測", detection_count=bear_count)
+        alert_sent = True
+
+    yield {
+        "event": "summary",
+        "total": total,
+        "bear_detected_count": bear_count,
+        "max_confidence": max_confidence,
+        "alert_sent": alert_sent
+    }
+
+# 批次圖片偵測 API：多個 images 欄位，或直接以 application/zip 上傳整包影像
+@api_bp.route('/api/detect_batch', methods=['POST'])
+def detect_bear_batch():
+    params = request.values
     try:
-        cap = cv2.VideoCapture(temp_video_path)
-        if not cap.isOpened():
-            return jsonify({"success": False, "error": "無法讀取影片檔案"}), 500
-
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        if fps == 0:
-            print("⚠️ FPS 無法讀取，使用預設 30 FPS")
-            fps = 30
-
-        alert_threshold_seconds = 3.0  # 恢復為 3 秒
-        frames_to_process_per_second = 1 # 保持較低的抽幀率以優化性能
-        frames_to_skip = max(1, int(fps / frames_to_process_per_second))
-        consecutive_frames_needed = int(alert_threshold_seconds * frames_to_process_per_second)
-
-        frame_count = 0
-        consecutive_bear_frames = 0
-        max_consecutive_duration = 0.0
-        highest_confidence_in_video = 0.0
-        alert_sent = False
+        concurrency = int(params.get('concurrency', DETECT_BATCH_CONCURRENCY))
+    except ValueError:
+        return jsonify({"success": False, "error": "concurrency 必須是整數"}), 400
+    concurrency = min(max(1, concurrency), MAX_VIDEO_INFERENCE_WORKERS)
+
+    if request.mimetype in ('application/zip', 'application/x-zip-compressed'):
+        temp_path = save_stream(request.stream, suffix=".zip")
+        if not zipfile.is_zipfile(temp_path):
+            os.remove(temp_path)
+            return jsonify({"success": False, "error": "無法讀取 zip 檔案"}), 400
+        images = iter_zip_images(temp_path, max_image_bytes=int(DETECT_BATCH_MAX_IMAGE_MB * 1024 * 1024))
+    else:
+        uploads = request.files.getlist('images') + request.files.getlist('image')
+        if not uploads:
+            return jsonify({"success": False, "error": "沒有上傳圖片檔案"}), 400
+        # 與影片分析相同，先把上傳檔存到磁碟：串流回應開始時請求（與其上傳檔）已經關閉
+        temp_path, saved = save_uploaded_images(uploads, max_images=DETECT_BATCH_MAX_IMAGES)
+        images = iter_saved_images(saved)
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret: break
+    events = batch_detection_events(images, concurrency)
 
-            frame_count += 1
-            if frame_count % frames_to_skip != 0: continue
-            
-            _, encoded = cv2.imencode(".jpg", frame)
-            api_response = detect_objects_in_image_data(encoded.tobytes())
-            detected, confidence = is_bear_detected(api_response)
+    if params.get('stream') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        return ndjson_response(events, lambda: remove_temp(temp_path), "伺服器處理圖片時發生錯誤")
 
-            if detected:
-                consecutive_bear_frames += 1
-                highest_confidence_in_video = max(highest_confidence_in_video, confidence)
+    try:
+        results = []
+        for event in events:
+            if event["event"] == "summary":
+                summary = {k: v for k, v in event.items() if k != "event"}
             else:
-                current_duration = (consecutive_bear_frames / frames_to_process_per_second)
-                max_consecutive_duration = max(max_consecutive_duration, current_duration)
-                consecutive_bear_frames = 0
-
-            if not alert_sent and consecutive_bear_frames >= consecutive_frames_needed:
-                send_bear_alert(
-                    confidence=highest_confidence_in_video,
-                    image_url=None,
-                    location="影片偵測區域"
-                )
-                alert_sent = True
-                print("🚨 即時觸發警報並停止分析")
-                break
-        
-        final_duration = (consecutive_bear_frames / frames_to_process_per_second)
-        max_consecutive_duration = max(max_consecutive_duration, final_duration)
+                results.append({k: v for k, v in event.items() if k != "event"})
+        return jsonify({"success": True, "results": results, **summary})
+    except Exception as e:
+        print(f"批次偵測時發生錯誤: {e}")
+        traceback.print_exc()
+        return jsonify({"success": False, "error": "伺服器處理圖片時發生錯誤"}), 500
+    finally:
+        events.close()
+        remove_temp(temp_path)
 
-        return jsonify({
-            "success": True,
-            "alert_sent": alert_sent,
-            "max_consecutive_duration_seconds": round(max_consecutive_duration, 2),
-            "video_fps": fps
-        })
+def parse_video_options(params):
+    """解析影片分析參數；格式錯誤時拋出 ValueError（訊息可直接回給前端）。"""
+    try:
+        workers = int(params.get('workers', VIDEO_INFERENCE_WORKERS))
+    except ValueError:
+        workers = VIDEO_INFERENCE_WORKERS
+    try:
+        motion_threshold = max(0.0, float(params.get('motion_threshold', VIDEO_MOTION_THRESHOLD)))
+    except ValueError:
+        raise ValueError("motion_threshold 必須是數字")
+
+    # sampling=adaptive：先粗掃描再於偵測處加密，適合長時間且大多沒有黑熊的影片
+    sampling = params.get('sampling', 'linear')
+    if sampling not in ('linear', 'adaptive'):
+        raise ValueError("sampling 參數只接受 linear 或 adaptive")
+    coarse_interval = params.get('coarse_interval', VIDEO_COARSE_INTERVAL_SECONDS)
+    try:
+        coarse_interval = float(coarse_interval) if coarse_interval else None
+    except ValueError:
+        raise ValueError("coarse_interval 必須是數字")
+
+    return {
+        "workers": min(max(1, workers), MAX_VIDEO_INFERENCE_WORKERS),
+        "motion_threshold": motion_threshold,
+        "sampling": sampling,
+        "coarse_interval": coarse_interval,
+    }
+
+def send_video_alert(confidence):
+    send_bear_alert(confidence=confidence, image_url=None, location="影片偵測區域")
+
+# ✅【修正一】影片分析 API，改回即時觸發警報的邏輯
+@api_bp.route('/api/analyze_video', methods=['POST'])
+def analyze_video():
+    # 影片分析（cv2）在第一次同步分析時才載入；非同步工作只在 worker 程序中載入
+    # 除了 multipart 表單，也接受直接以 video/* 或 application/octet-stream 為 body 上傳，參數放在 query string
+    raw_upload = request.mimetype.startswith('video/') or request.mimetype == 'application/octet-stream'
+    if not raw_upload:
+        with timed('upload'):
+            files = request.files
+        if 'video' not in files:
+            return jsonify({"success": False, "error": "沒有上傳影片檔案"}), 400
+        video_file = files['video']
+        if video_file.filename == '':
+            return jsonify({"success": False, "error": "沒有選擇檔案"}), 400
+
+    params = request.values
+    try:
+        options = parse_video_options(params)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    # async=1：存檔後立即回傳工作 ID，交給背景 worker 程序分析
+    run_async = params.get('async') in ('1', 'true')
+    directory = None
+    if run_async:
+        os.makedirs(VIDEO_JOB_DIR, exist_ok=True)
+        directory = VIDEO_JOB_DIR
+
+    temp_video_path = save_stream(request.stream, suffix=".mp4", directory=directory) if raw_upload \
+        else save_upload(video_file, suffix=".mp4", directory=directory)
+
+    if run_async:
+        return submit_video_job(temp_video_path, options)
+
+    from src.services.video_analysis import analyze_video_events
+    events = analyze_video_events(temp_video_path, classify_frame, send_video_alert, **options)
+
+    # stream=ndjson：逐個抽樣幀輸出結果，不必等整支影片分析完
+    if params.get('stream') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        return ndjson_response(events, lambda: os.remove(temp_video_path), "伺服器處理影片時發生錯誤")
+
+    try:
+        for event in events:
+            if event["event"] == "error":
+                return jsonify({"success": False, "error": event["error"]}), 500
+            if event["event"] == "result":
+                return jsonify({k: v for k, v in event.items() if k != "event"})
+        return jsonify({"success": False, "error": "伺服器處理影片時發生錯誤"}), 500
 
     except Exception as e:
         traceback.print_exc()
         return jsonify({"success": False, "error": f"伺服器處理影片時發生錯誤: {e}"}), 500
     finally:
-        if cap:
-            cap.release()
+        events.close()
         os.remove(temp_video_path)
 
+# --- 非同步影片分析工作 ---
+video_job_pool = VideoJobPool(DATABASE_URI, classify_frame, send_video_alert, processes=VIDEO_JOB_WORKERS)
+video_job_pool_lock = threading.Lock()
+atexit.register(video_job_pool.shutdown)
+
+def ensure_video_job_pool():
+    """
+    啟動 worker 程序，同時把重啟前中斷的工作放回佇列。
+
+    工作透過資料庫排隊，由啟動了 worker 的程序領取；只在 __main__、VIDEO_JOBS_IN_APP 與
+    video-workers 指令中呼叫，請求處理中不會啟動，worker 數量才不會隨 gunicorn 的 worker 數增加。
+    """
+    with video_job_pool_lock:
+        if not video_job_pool.running:
+            video_job_pool.start()
+
+@api_bp.cli.command('video-workers')
+def video_workers_command():
+    """執行非同步影片分析的 worker 程序，直到收到 SIGINT / SIGTERM。"""
+    import signal
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    ensure_video_job_pool()
+    try:
+        while video_job_pool.running and not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        video_job_pool.shutdown()
+
+def submit_video_job(video_path, options):
+    try:
+        job = submit_job(video_path, options, VIDEO_JOB_QUEUE_LIMIT)
+    except JobQueueFull:
+        os.remove(video_path)
+        response = jsonify({"success": False, "error": "影片分析佇列已滿，請稍後再試"})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}"
+    }), 202
+
+@api_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_video_job(job_id):
+    job = db.session.get(VideoJob, job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "找不到此分析工作"}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
+# --- 攝影機串流監控 ---
+def send_stream_alert(stream_name, confidence):
+    send_bear_alert(confidence=confidence, image_url=None, location=f"串流 {stream_name}")
+
+# 有設定串流來源時才建立（並載入 cv2）
+stream_monitor = None
+
+def ensure_stream_monitor():
+    # 多個程序（例如 gunicorn 多個 worker）時只應在其中一個啟動，否則同一串流會被重複監控
+    global stream_monitor
+    if not STREAM_MONITOR_SOURCES:
+        return
+    from src.services.stream_monitor import StreamMonitorManager, parse_stream_sources
+    if stream_monitor is None:
+        stream_monitor = StreamMonitorManager(
+            classify_frame, send_stream_alert, inference_workers=STREAM_MONITOR_WORKERS, sample_fps=STREAM_MONITOR_FPS
+        )
+        atexit.register(stream_monitor.shutdown)
+    if not stream_monitor.running:
+        stream_monitor.start(parse_stream_sources(STREAM_MONITOR_SOURCES))
+
+@api_bp.route('/api/streams', methods=['GET'])
+def get_streams():
+    if STREAM_MONITOR_SOURCES and not (stream_monitor and stream_monitor.running):
+        return jsonify({"success": False, "error": "已設定串流來源，但此程序未啟動串流監控", "streams": []}), 503
+    return jsonify({"success": True, "streams": stream_monitor.status() if stream_monitor else []})
+
+@api_bp.route('/api/streams/<name>', methods=['GET'])
+def get_stream(name):
+    status = stream_monitor.status(name) if stream_monitor else None
+    if status is None:
+        return jsonify({"success": False, "error": "找不到此串流"}), 404
+    return jsonify({"success": True, **status})
+
+# --- 地圖資料 ---
+# pandas / numpy 在第一次用到時才匯入；伺服器開始監聽後由 warm_map_data() 在背景預先載入，
+# 之後由 SightingStore 依 CSV 的 mtime 自動重新載入
+sighting_store = None
+sighting_index = None
+sighting_lock = threading.Lock()
+
+def get_sighting_store():
+    global sighting_store
+    with sighting_lock:
+        if sighting_store is None:
+            from src.services.sighting_store import SightingStore, DEFAULT_CSV_PATH
+            sighting_store = SightingStore(SIGHTINGS_CSV_PATH or DEFAULT_CSV_PATH)
+    return sighting_store
+
+def get_sighting_index():
+    global sighting_index
+    with sighting_lock:
+        if sighting_index is None:
+            from src.services.sighting_index import SqliteSightingIndex
+            sighting_index = SqliteSightingIndex()
+    return sighting_index
+
+def warm_map_data():
+    try:
+        with timed('map_warmup'):
+            if SIGHTINGS_BACKEND == 'sqlite':
+                get_sighting_index()
+            else:
+                # snapshot() 載入時持有鎖，同時進來的 /api/map 會等這次載入完成而不是重複解析
+                get_sighting_store().snapshot()
+    except Exception as e:
+        print(f"Warning: 無法預先載入地圖資料: {e}")
+
+def start_map_warmup():
+    threading.Thread(target=warm_map_data, name='map-warmup', daemon=True).start()
+
+@api_bp.cli.command('ingest-sightings')
+@click.argument('csv_paths', nargs=-1, required=True)
+@click.option('--encoding', default=None, help='CSV 檔案編碼，例如 cp950')
+def ingest_sightings_command(csv_paths, encoding):
+    """把目擊資料 CSV 匯入（或追加到）SQLite 的 sighting 表與 R*Tree 索引。"""
+    from src.services.sighting_index import ingest_csv
+    for csv_path in csv_paths:
+        added = ingest_csv(csv_path, encoding=encoding)
+        print(f"{csv_path}: 新增 {added} 筆目擊資料")
+
+def parse_date_range_args():
+    """解析 start / end 查詢參數，格式錯誤時拋出 ValueError。"""
+    start_date = request.args.get('start')
+    end_date = request.args.get('end')
+    start_dt = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+    end_dt = datetime.strptime(end_date, "%Y-%m-%d") if end_date else None
+    return start_dt, end_dt
+
+def conditional_json(etag, last_modified, build_payload):
+    """ETag / Last-Modified 相符時直接回 304，不必重新產生回應內容。"""
+    if request.if_none_match.contains(etag) or (
+        not request.if_none_match and request.if_modified_since and request.if_modified_since >= last_modified
+    ):
+        response = Response(status=304)
+    else:
+        with timed('map_serialize'):
+            response = jsonify(build_payload())
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
 # ✅【修正二】地圖 API，改為回傳純資料
-@app.route('/api/map', methods=['GET'])
-# @cache.cached(query_string=True) # 先註解掉快取，方便除錯
+@api_bp.route('/api/map', methods=['GET'])
 def get_bear_map():
+    from src.services.sighting_clusters import MAX_ZOOM, get_cluster_index, parse_bbox
     try:
-        file_path = 'src/台灣黑熊.csv'
-        df = pd.read_csv(file_path)
-        df['eventdate'] = pd.to_datetime(df['eventdate'], errors='coerce')
-        df.dropna(subset=['eventdate', 'verbatimlatitude', 'verbatimlongitude'], inplace=True)
-
-        start_date = request.args.get('start')
-        end_date = request.args.get('end')
         try:
-            if start_date:
-                start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-                df = df[df['eventdate'] >= start_dt]
-            if end_date:
-                end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-                df = df[df['eventdate'] <= end_dt]
+            start_dt, end_dt = parse_date_range_args()
         except ValueError:
             return jsonify({"success": False, "error": "日期格式錯誤，請使用 YYYY-MM-DD"}), 400
 
-        locations = []
-        for _, row in df.iterrows():
-            locations.append({
-                "lat": row['verbatimlatitude'],
-                "lng": row['verbatimlongitude'],
-                "popup_html": f"""
-                    <b>事件ID:</b> {row['occurrenceid']}<br>
-                    <b>日期:</b> {row['eventdate'].date()}<br>
-                """
-            })
-        
-        return jsonify({"success": True, "locations": locations})
+        # format=locations（預設，相容舊前端）或 format=columnar（欄位式精簡格式）
+        output_format = request.args.get('format', 'locations')
+        if output_format not in ('locations', 'columnar'):
+            return jsonify({"success": False, "error": "format 參數只接受 locations 或 columnar"}), 400
+
+        # 有 zoom 參數時改回傳伺服器端分群結果（可搭配 bbox 限定畫面範圍）
+        zoom = request.args.get('zoom')
+        bbox = request.args.get('bbox')
+        try:
+            zoom = int(zoom) if zoom is not None else None
+            bbox = parse_bbox(bbox) if bbox else None
+        except ValueError:
+            return jsonify({"success": False, "error": "bbox 或 zoom 參數格式錯誤"}), 400
+        if zoom is not None and not 0 <= zoom <= MAX_ZOOM:
+            return jsonify({"success": False, "error": f"zoom 必須介於 0 到 {MAX_ZOOM}"}), 400
+
+        def build_points(rows):
+            if output_format == 'columnar':
+                return {"success": True, "count": len(rows), "columns": rows.to_columnar()}
+            return {"success": True, "locations": rows.to_locations()}
+
+        # 點位查詢走 R*Tree 索引，不需要在本程序載入 CSV
+        if zoom is None and SIGHTINGS_BACKEND == 'sqlite':
+            index = get_sighting_index()
+            version, last_modified = index.state()
+            etag = index.etag(version, 'map', output_format, start_dt, end_dt, bbox)
+            return conditional_json(
+                etag, last_modified, lambda: build_points(index.query(start_dt, end_dt, bbox))
+            )
+
+        snapshot = get_sighting_store().snapshot()
+        sightings = snapshot.query(start_dt, end_dt)
+
+        if zoom is not None:
+            etag = snapshot.etag('clusters', zoom, bbox, sightings.lo, sightings.hi)
+
+            def build_clusters():
+                clusters = get_cluster_index(snapshot).cluster(sightings, zoom, bbox)
+                return {
+                    "success": True,
+                    "zoom": zoom,
+                    "count": sum(c["count"] for c in clusters),
+                    "clusters": clusters,
+                }
+
+            return conditional_json(etag, snapshot.last_modified, build_clusters)
+
+        etag = snapshot.etag('map', output_format, sightings.lo, sightings.hi, bbox)
+        rows = sightings.within(bbox) if bbox else sightings
+        return conditional_json(etag, snapshot.last_modified, lambda: build_points(rows))
 
     except FileNotFoundError:
         return jsonify({"success": False, "error": "找不到地圖資料檔案"}), 404
@@ -271,9 +714,152 @@ def get_bear_map():
         traceback.print_exc()
         return jsonify({"success": False, "error": "產生熱點圖時發生錯誤"}), 500
 
+# 熱點圖密度 API：以每月直方圖的累積和回答任意日期區間
+@api_bp.route('/api/map/density', methods=['GET'])
+def get_bear_density():
+    from src.services.sighting_density import DEFAULT_CELL_SIZE, get_density_grid
+    try:
+        try:
+            start_dt, end_dt = parse_date_range_args()
+        except ValueError:
+            return jsonify({"success": False, "error": "日期格式錯誤，請使用 YYYY-MM-DD"}), 400
+
+        snapshot = get_sighting_store().snapshot()
+        try:
+            cell_size = float(request.args.get('cell', DEFAULT_CELL_SIZE))
+            grid = get_density_grid(snapshot, cell_size)
+        except ValueError as e:
+            return jsonify({"success": False, "error": f"cell 參數錯誤: {e}"}), 400
+
+        month_window = grid.month_window(start_dt, end_dt)
+        etag = snapshot.etag('density', cell_size, *month_window)
+        return conditional_json(etag, snapshot.last_modified, lambda: grid.to_payload(start_dt, end_dt))
+
+    except FileNotFoundError:
+        return jsonify({"success": False, "error": "找不到地圖資料檔案"}), 404
+    except Exception as e:
+        print(f"密度圖產生失敗: {e}")
+        traceback.print_exc()
+        return jsonify({"success": False, "error": "產生熱點圖時發生錯誤"}), 500
+
+# --- 效能指標 ---
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'bear_http_request_duration_seconds', "HTTP request handling time.", ('endpoint', 'method', 'status')
+)
+
+@api_bp.before_app_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    start_request_timings()
+
+@api_bp.after_app_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_started
+    timings = finish_request_timings()
+    HTTP_REQUEST_SECONDS.observe(
+        elapsed, endpoint=request.endpoint or 'unmatched', method=request.method, status=response.status_code
+    )
+    if METRICS_TIMING_HEADER:
+        response.headers['Server-Timing'] = server_timing_header(timings, elapsed)
+    return response
+
+def collect_component_metrics():
+    """偵測快取與警報派送器自己維護的統計。"""
+    # 抓取指標不應觸發建立 bot 與派送執行緒；尚未送過警報時各項皆為 0
+    dispatcher = alert_dispatcher
+    if dispatcher is not None:
+        alerts = dispatcher.stats()
+    else:
+        alerts = dict.fromkeys(('queued', 'submitted', 'sent', 'coalesced', 'dropped', 'failed'), 0)
+    families = [
+        ('bear_alerts_total', 'counter', "Alerts by outcome.",
+         [({'result': key}, alerts[key]) for key in ('submitted', 'sent', 'coalesced', 'dropped', 'failed')]),
+        ('bear_alert_queue_size', 'gauge', "Alerts waiting to be sent.", [({}, alerts['queued'])]),
+    ]
+    if inference_client.cache is not None:
+        stats = inference_client.cache.stats()
+        families += [
+            ('bear_detection_cache_hits_total', 'counter', "Detection cache hits.",
+             [({'kind': 'exact'}, stats['hits']), ({'kind': 'near_duplicate'}, stats['near_duplicate_hits'])]),
+            ('bear_detection_cache_misses_total', 'counter', "Detection cache misses.", [({}, stats['misses'])]),
+            ('bear_detection_cache_evictions_total', 'counter', "Detection cache evictions.", [({}, stats['evictions'])]),
+            ('bear_detection_cache_entries', 'gauge', "Entries in the detection cache.", [({}, stats['entries'])]),
+        ]
+    return families
+
+REGISTRY.register_collector(collect_component_metrics)
+
+@api_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# --- Flask App 初始化與設定 ---
+def create_app(warm_start=True):
+    """
+    建立並設定 Flask app：CORS、快取、資料庫與所有藍圖。
+
+    warm_start 為 True 時在背景執行緒預先載入地圖資料；gunicorn 在 master 程序已開始監聽後
+    才於各 worker 中呼叫本函式，所以載入不會延後可接受連線的時間。
+    """
+    app = Flask(__name__)
+    # 允許來自 Render 前端和本地測試伺服器的請求
+    CORS(app, origins=["https://bear-detection-app.onrender.com", "http://localhost:5173"])
+    # 初始化快取
+    cache.init_app(app)
+    # 初始化資料庫；先匯入所有模型，create_all 才會建立對應的資料表（含 R*Tree 索引）
+    from src.models import sighting, user, video_job  # noqa: F401
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        upgrade_schema(db.engine)
+
+    app.register_blueprint(api_bp)
+    # 主程式已有 /api/detect，偵測藍圖放在 /api/detection 之下（/api/detection/detect、/api/detection/health）
+    app.register_blueprint(detection_bp, url_prefix='/api/detection')
+    app.register_blueprint(user_bp, url_prefix='/api')
+
+    if warm_start:
+        start_map_warmup()
+    if VIDEO_JOBS_IN_APP:
+        ensure_video_job_pool()
+    if STREAM_MONITOR_IN_APP:
+        ensure_stream_monitor()
+    elif STREAM_MONITOR_SOURCES and __name__ != '__main__' and stream_monitor is None:
+        # 直接執行本檔時由 __main__ 在開始監聽後啟動；其他啟動方式不會有人啟動串流監控
+        print("Error: 已設定 STREAM_MONITOR_SOURCES，但此程序不會啟動串流監控；"
+              "以 WSGI 伺服器啟動時請設定 STREAM_MONITOR_IN_APP=1（並只使用一個 worker）")
+    return app
+
+def __getattr__(name):
+    # 相容以 src.main:app 啟動的設定：第一次存取 app 屬性時才建立
+    global app
+    if name == 'app':
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # 啟動伺服器
 if __name__ == '__main__':
     # 修正 debug=True 造成的重複執行問題
     # 在 Render 上，debug 模式應為 False
     debug_mode = os.environ.get('FLASK_ENV') == 'development'
-    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=debug_mode)
\ No newline at end of file
+    port = int(os.environ.get('PORT', 5000))
+    if debug_mode:
+        # 先建立 app（建立資料表），worker 啟動時才能把中斷的工作放回佇列；
+        # debug 模式下只在實際服務請求的重新載入子程序中啟動 worker
+        app = create_app()
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            ensure_video_job_pool()
+            ensure_stream_monitor()
+        app.run(host='0.0.0.0', port=port, debug=True)
+    else:
+        from werkzeug.serving import make_server
+        # 先開始監聽，再啟動背景工作與預先載入地圖資料，平台的健康檢查與第一個請求不必等它們完成
+        server = make_server('0.0.0.0', port, create_app(warm_start=False), threaded=True)
+        print(f" * Running on http://0.0.0.0:{port}")
+        start_map_warmup()
+        ensure_video_job_pool()
+        ensure_stream_monitor()
+        server.serve_forever()
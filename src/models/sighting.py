@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from sqlalchemy import DDL, event
+
+from src.models.user import db
+
+
+class Sighting(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    occurrenceid = db.Column(db.String(64), unique=True, nullable=False)
+    eventdate = db.Column(db.Date, nullable=False)
+    lat = db.Column(db.Float, nullable=False)
+    lng = db.Column(db.Float, nullable=False)
+    ingested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Sighting {self.occurrenceid}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'occurrenceid': self.occurrenceid,
+            'eventdate': self.eventdate.isoformat(),
+            'lat': self.lat,
+            'lng': self.lng
+        }
+
+
+# R*Tree 空間-時間索引：id 對應 sighting.id，時間維度為 1970-01-01 起算的日數
+SIGHTING_RTREE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS sighting_rtree USING rtree("
+    "id, min_lng, max_lng, min_lat, max_lat, min_day, max_day)"
+)
+
+event.listen(Sighting.__table__, 'after_create', DDL(SIGHTING_RTREE_DDL).execute_if(dialect='sqlite'))
@@ -0,0 +1,37 @@
+import json
+from datetime import datetime
+
+from src.models.user import db
+
+
+class VideoJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)
+    video_path = db.Column(db.String(512), nullable=False)
+    options = db.Column(db.Text, nullable=False, default='{}')
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    frames_processed = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    worker_pid = db.Column(db.Integer)
+    # 開機 ID + PID + 程序啟動時間，重啟後 PID 被重用時仍能辨認出已中斷的工作
+    worker_id = db.Column(db.String(96))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<VideoJob {self.id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': round(self.progress, 3),
+            'frames_processed': self.frames_processed,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
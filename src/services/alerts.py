@@ -0,0 +1,296 @@
+# src/services/alerts.py
+# 警報發送：Telegram 用戶端，以及在背景執行緒中合併、限速與重試的警報派送器，偵測請求不必等待 Telegram 回應。
+
+import os
+import queue
+import random
+import threading
+import time
+
+import requests
+
+from src.services.metrics import REGISTRY, timed
+
+DEFAULT_TELEGRAM_API_BASE = "https://api.telegram.org"
+
+ALERT_LATENCY_SECONDS = REGISTRY.histogram(
+    'bear_alert_latency_seconds', "Time from an alert being raised to its delivery.", ('kind',)
+)
+
+
+class AlertDeliveryError(Exception):
+    """發送失敗；retryable 為 False 時（例如 400）重試也不會成功。"""
+
+    def __init__(self, message, retryable=True, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class TelegramBot:
+    def __init__(self, bot_token, chat_id, api_base=DEFAULT_TELEGRAM_API_BASE, timeout=(5.0, 15.0)):
+        if not bot_token or not chat_id:
+            print("Warning: Telegram Bot token or chat_id is missing. Notifications will be disabled.")
+            self.bot_token = None
+            self.chat_id = None
+        else:
+            self.bot_token = bot_token
+            self.chat_id = chat_id
+            self.base_url = f"{api_base.rstrip('/')}/bot{self.bot_token}"
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    @property
+    def enabled(self):
+        return self.bot_token is not None
+
+    def _post(self, method, data):
+        try:
+            with timed('telegram_send'):
+                response = self.session.post(f"{self.base_url}/{method}", json=data, timeout=self.timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            raise AlertDeliveryError(f"無法連線到 Telegram: {e}")
+        if response.ok:
+            return
+        retry_after = None
+        try:
+            retry_after = response.json().get('parameters', {}).get('retry_after')
+        except ValueError:
+            pass
+        raise AlertDeliveryError(
+            f"Telegram API 回應 {response.status_code}: {response.text[:200]}",
+            retryable=response.status_code == 429 or response.status_code >= 500,
+            retry_after=retry_after,
+        )
+
+    def send_message(self, message):
+        if not self.bot_token: return
+        self._post("sendMessage", {"chat_id": self.chat_id, "text": message, "parse_mode": "HTML"})
+        print("Telegram message sent successfully.")
+
+    def send_photo(self, photo_url, caption=""):
+        if not self.bot_token: return
+        self._post("sendPhoto", {"chat_id": self.chat_id, "photo": photo_url, "caption": caption, "parse_mode": "HTML"})
+        print("Telegram photo sent successfully.")
+
+
+class Alert:
+    """
+    一則待發送的警報。
+
+    coalesced 是合併進這則訊息的警報數，window_seconds 為合併的時間窗；
+    兩者皆為 0 時代表單一、即時的警報。
+    """
+
+    def __init__(self, source, confidence, image_url=None, detection_count=None):
+        self.source = source
+        self.confidence = confidence
+        self.image_url = image_url
+        self.detection_count = detection_count
+        self.coalesced = 0
+        self.window_seconds = 0.0
+        self.created_at = time.monotonic()
+
+
+class _Window:
+    __slots__ = ('deadline', 'pending')
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.pending = None
+
+
+_STOP = object()
+
+
+class AlertDispatcher:
+    """
+    在背景執行緒發送警報。
+
+    每個來源（source）的第一則警報立即發送；之後 window 秒內的警報合併成一則摘要，
+    在時間窗結束時發送（例如「另有 5 次偵測，最高信心度 93%」）。
+    發送以每分鐘 rate_per_minute 則為上限，可重試的失敗以指數退避重試 max_retries 次。
+    """
+
+    def __init__(self, deliver_fn, window=30.0, rate_per_minute=20, max_retries=3,
+                 backoff_base=1.0, backoff_max=30.0, queue_size=1000):
+        self.deliver_fn = deliver_fn
+        self.window = window
+        self.rate_per_minute = rate_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_size = queue_size
+        self.submitted = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._windows = {}
+        self._tokens = float(self.rate_per_minute)
+        self._refilled_at = time.monotonic()
+        self._thread = None
+        self._pid = os.getpid()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            # fork 之後背景執行緒不會跟著複製，子程序需重新建立
+            if self._pid != os.getpid():
+                self._reset()
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='alert-dispatcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, source, confidence, image_url=None, detection_count=None):
+        """把警報排入佇列後立即返回；佇列已滿時丟棄並回傳 False。"""
+        if not self.running or self._pid != os.getpid():
+            self.start()
+        try:
+            self._queue.put_nowait(Alert(source, confidence, image_url, detection_count))
+        except queue.Full:
+            self.dropped += 1
+            print(f"警報佇列已滿，丟棄來自 {source} 的警報")
+            return False
+        self.submitted += 1
+        return True
+
+    def shutdown(self, timeout=10.0):
+        """送出佇列中與尚未結束時間窗的警報後停止背景執行緒。"""
+        if not self.running:
+            return
+        self._stop.set()
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'submitted': self.submitted,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    def _next_timeout(self):
+        if not self._windows:
+            return None
+        return max(0.0, min(w.deadline for w in self._windows.values()) - time.monotonic())
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self._next_timeout())
+            except queue.Empty:
+                item = None
+            # 一次處理所有已排隊的警報，發送較慢時也能合併在同一個時間窗內
+            while item is not None and item is not _STOP:
+                self._accept(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            if item is _STOP:
+                break
+            self._flush_windows()
+
+        # 停止前：處理剩下的警報，並立即送出所有尚未送出的摘要
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                self._accept(item)
+        self._flush_windows(force=True)
+
+    def _accept(self, alert):
+        if self.window <= 0:
+            self._deliver(alert)
+            return
+        # 時間窗以警報產生的時間計算，而不是派送器處理到它的時間
+        window = self._windows.get(alert.source)
+        if window is not None and alert.created_at >= window.deadline:
+            self._close_window(alert.source, window, alert.created_at)
+            window = self._windows.get(alert.source)
+        if window is None:
+            self._windows[alert.source] = _Window(alert.created_at + self.window)
+            self._deliver(alert)
+            return
+
+        pending = window.pending
+        if pending is None:
+            window.pending = pending = Alert(alert.source, alert.confidence, alert.image_url)
+            pending.detection_count = 0
+            pending.window_seconds = self.window
+        pending.confidence = max(pending.confidence, alert.confidence)
+        pending.image_url = alert.image_url or pending.image_url
+        pending.detection_count += alert.detection_count or 1
+        pending.coalesced += 1
+        self.coalesced += 1
+
+    def _close_window(self, source, window, now):
+        if window.pending is None:
+            del self._windows[source]
+            return
+        # 有摘要送出時開始新的時間窗，持續的偵測每個時間窗最多只發一則
+        pending, window.pending = window.pending, None
+        window.deadline = now + self.window
+        self._deliver(pending)
+
+    def _flush_windows(self, force=False):
+        now = time.monotonic()
+        for source, window in list(self._windows.items()):
+            if force or window.deadline <= now:
+                self._close_window(source, window, now)
+
+    def _take_token(self):
+        """令牌桶限速；停止中不再等待。"""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                float(self.rate_per_minute), self._tokens + (now - self._refilled_at) * self.rate_per_minute / 60.0
+            )
+            self._refilled_at = now
+            if self._tokens >= 1 or self._stop.is_set():
+                self._tokens -= 1
+                return
+            self._stop.wait((1 - self._tokens) * 60.0 / self.rate_per_minute)
+
+    def _deliver(self, alert):
+        for attempt in range(self.max_retries + 1):
+            self._take_token()
+            try:
+                self.deliver_fn(alert)
+                self.sent += 1
+                # 摘要的延遲包含等待時間窗結束的時間
+                ALERT_LATENCY_SECONDS.observe(
+                    time.monotonic() - alert.created_at, kind='summary' if alert.coalesced else 'immediate'
+                )
+                return
+            except AlertDeliveryError as e:
+                error = e
+                if not e.retryable:
+                    break
+                delay = e.retry_after
+            except Exception as e:
+                error = e
+                delay = None
+            if attempt < self.max_retries:
+                if delay is None:
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                self._stop.wait(min(float(delay), self.backoff_max))
+        self.failed += 1
+        print(f"發送 Telegram 警報失敗（{alert.source}）: {error}")
@@ -0,0 +1,89 @@
+# src/services/batch_detection.py
+# 批次影像偵測：以有上限的並行度把多張影像送去偵測，依完成順序回傳結果。
+
+import os
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+
+
+def is_image_filename(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in IMAGE_EXTENSIONS
+
+
+def save_uploaded_images(file_storages, max_images=None):
+    """
+    把 multipart 上傳的圖片存進新的暫存資料夾，回傳 (資料夾, [(filename, path)])；呼叫端負責刪除資料夾。
+
+    串流回應在請求結束、上傳檔已關閉之後才開始讀取影像，所以必須先存到磁碟。
+    """
+    directory = tempfile.mkdtemp(prefix='bear-batch-')
+    saved = []
+    for file_storage in file_storages:
+        if max_images is not None and len(saved) >= max_images:
+            break
+        if file_storage.filename and is_image_filename(file_storage.filename):
+            path = os.path.join(directory, f"{len(saved)}.{file_storage.filename.rsplit('.', 1)[1].lower()}")
+            file_storage.save(path)
+            saved.append((file_storage.filename, path))
+    return directory, saved
+
+
+def iter_saved_images(saved):
+    """逐一讀取 save_uploaded_images 存下的圖片，產生 (filename, bytes)。"""
+    for filename, path in saved:
+        with open(path, 'rb') as f:
+            yield filename, f.read()
+
+
+def iter_zip_images(zip_path, max_image_bytes=None):
+    """
+    逐一讀取 zip 內的圖片（略過資料夾與 macOS 的 __MACOSX 資料），產生 (filename, bytes)。
+
+    zip 來自使用者上傳，解壓後超過 max_image_bytes 的項目直接略過，不解壓進記憶體；
+    zipfile 最多只會讀出標頭宣告的大小，所以檢查 file_size 就足夠。
+    """
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or info.filename.startswith('__MACOSX/'):
+                continue
+            filename = os.path.basename(info.filename)
+            if not is_image_filename(filename) or filename.startswith('._'):
+                continue
+            if max_image_bytes is not None and info.file_size > max_image_bytes:
+                print(f"Warning: 略過 zip 中過大的圖片 {info.filename}（{info.file_size} bytes）")
+                continue
+            yield info.filename, archive.read(info)
+
+
+def detect_concurrently(images, detect_fn, concurrency, max_images=None):
+    """
+    依完成順序產生 (index, filename, result, error)。
+
+    一次最多 concurrency 個偵測同時進行，也只預先讀取這麼多張影像，
+    所以記憶體用量與批次大小無關。
+    """
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-detect') as executor:
+        for index, (filename, image_bytes) in enumerate(images):
+            if max_images is not None and index >= max_images:
+                break
+            if len(in_flight) >= concurrency:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _finished(future, *in_flight.pop(future))
+            in_flight[executor.submit(detect_fn, image_bytes)] = (index, filename)
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _finished(future, *in_flight.pop(future))
+
+
+def _finished(future, index, filename):
+    try:
+        return index, filename, future.result(), None
+    except Exception as e:
+        return index, filename, None, e
@@ -0,0 +1,135 @@
+# src/services/detection_cache.py
+# 偵測結果快取：以圖片內容的雜湊為鍵，另可用 dHash 比對近似重複的圖片；LRU + TTL + 記憶體上限。
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# 每筆快取除了結果本身之外的估計額外開銷（位元組）
+_ENTRY_OVERHEAD = 256
+
+
+def dhash(image_bytes):
+    """64 位元的差異雜湊；無法解碼時回傳 None。"""
+    # 只有開啟近似重複比對時才需要 cv2，未開啟時不必在啟動時載入
+    import cv2
+    import numpy as np
+
+    # 解碼時直接縮小 8 倍，比完整解碼再縮圖快得多
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+class _Entry:
+    __slots__ = ('result', 'size', 'expires_at', 'dhash')
+
+    def __init__(self, result, size, expires_at, dhash_value):
+        self.result = result
+        self.size = size
+        self.expires_at = expires_at
+        self.dhash = dhash_value
+
+
+class DetectionCache:
+    """
+    依圖片位元組的 SHA-256 快取模型回傳的 JSON。
+
+    near_duplicate_distance > 0 時，沒有完全相同的項目會再找 dHash 漢明距離在門檻內的項目。
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=3600, near_duplicate_distance=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.near_duplicate_distance = near_duplicate_distance
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, image_bytes):
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _lookup_near(self, dhash_value, now):
+        best_key = None
+        best_distance = self.near_duplicate_distance + 1
+        for key, entry in self._entries.items():
+            if entry.dhash is None or entry.expires_at < now:
+                continue
+            distance = (entry.dhash ^ dhash_value).bit_count()
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        return best_key
+
+    def get(self, image_bytes):
+        """回傳 (result, key, dhash)；未命中時 result 為 None，key / dhash 可直接交給 put()。"""
+        key = self.key(image_bytes)
+        dhash_value = None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at < now:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.result, key, entry.dhash
+
+        if self.near_duplicate_distance > 0:
+            dhash_value = dhash(image_bytes)
+            if dhash_value is not None:
+                with self._lock:
+                    near_key = self._lookup_near(dhash_value, now)
+                    if near_key is not None:
+                        self._entries.move_to_end(near_key)
+                        self.near_hits += 1
+                        return self._entries[near_key].result, key, dhash_value
+
+        with self._lock:
+            self.misses += 1
+        return None, key, dhash_value
+
+    def put(self, key, result, dhash_value=None):
+        size = len(json.dumps(result)) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(result, size, time.monotonic() + self.ttl, dhash_value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'near_duplicate_hits': self.near_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,98 @@
+# src/services/detectors.py
+# 偵測後端：Hugging Face API 與本機 CPU 上的 ONNX 模型（見 onnx_detector.py）共用同一個介面，可依設定排序並自動備援。
+
+import threading
+
+import requests
+
+from src.services.inference_client import InferenceError, get_inference_client
+from src.services.metrics import REGISTRY
+
+DETECTOR_CALLS = REGISTRY.counter(
+    'bear_detector_calls_total', "Detection calls per backend and outcome.", ('backend', 'outcome')
+)
+
+
+class DetectorBackend:
+    """detect() 回傳與 Hugging Face API 相同格式的 {"detections": [{label, confidence, box}, ...]}。"""
+
+    name = None
+
+    @property
+    def available(self):
+        return True
+
+    def detect(self, image_bytes, filename="upload.jpg", content_type="image/jpeg"):
+        raise NotImplementedError
+
+    def status(self):
+        return {'name': self.name, 'available': self.available}
+
+
+class HuggingFaceDetector(DetectorBackend):
+    name = 'hf'
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or get_inference_client()
+
+    @property
+    def available(self):
+        return bool(self.client.api_token)
+
+    def detect(self, image_bytes, filename="upload.jpg", content_type="image/jpeg"):
+        return self.client.predict(image_bytes, filename=filename, content_type=content_type)
+
+    def status(self):
+        return {**super().status(), 'circuit': self.client.breaker.state}
+
+
+class FallbackDetector:
+    """依序嘗試各後端；無法使用或失敗時改用下一個，全部失敗時拋出最後一個錯誤。"""
+
+    def __init__(self, backends):
+        self.backends = list(backends)
+
+    def detect(self, image_bytes, filename="upload.jpg", content_type="image/jpeg"):
+        error = None
+        for backend in self.backends:
+            if not backend.available:
+                continue
+            try:
+                result = backend.detect(image_bytes, filename=filename, content_type=content_type)
+            except (InferenceError, requests.exceptions.RequestException) as e:
+                print(f"偵測後端 {backend.name} 失敗: {e}")
+                DETECTOR_CALLS.inc(backend=backend.name, outcome='error')
+                error = e
+                continue
+            DETECTOR_CALLS.inc(backend=backend.name, outcome='success')
+            return result
+        if error is None:
+            raise InferenceError("沒有可用的偵測後端")
+        raise error
+
+    def status(self):
+        return [backend.status() for backend in self.backends]
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def configure_detector(backends):
+    global _detector
+    with _detector_lock:
+        _detector = FallbackDetector(backends)
+    return _detector
+
+
+def get_detector():
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = FallbackDetector([HuggingFaceDetector()])
+    return _detector
@@ -0,0 +1,125 @@
+# src/services/image_preprocess.py
+# 推論前的影像正規化：修正 EXIF 方向、縮小到模型輸入尺寸並以調整過的品質重新編碼，減少上傳量。
+
+import base64
+import io
+import os
+import time
+
+from PIL import Image, ImageDraw, ImageOps
+
+from src.services.metrics import timed
+
+# 模型輸入邊長（YOLO 類模型通常為 640），更大的影像在上傳前先縮小
+MODEL_INPUT_SIZE = int(os.getenv("MODEL_INPUT_SIZE", "640"))
+INFERENCE_JPEG_QUALITY = int(os.getenv("INFERENCE_JPEG_QUALITY", "85"))
+THUMBNAIL_SIZE = 320
+THUMBNAIL_JPEG_QUALITY = 70
+
+_EXIF_ORIENTATION = 0x0112
+
+
+class PreparedImage:
+    """
+    上傳給模型的位元組，以及繪製縮圖時需要的正規化後影像。
+
+    size 為 data 的影像尺寸（模型回傳的偵測框座標以此為準），original_size 為上傳原圖的尺寸。
+    """
+
+    def __init__(self, data, image, original_bytes, encode_ms, original_size=None, size=None):
+        self.data = data
+        self.image = image
+        self.original_bytes = original_bytes
+        self.encode_ms = encode_ms
+        self.original_size = original_size
+        self.size = size or (image.size if image is not None else None)
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.data)
+
+
+@timed('image_preprocess')
+def prepare_image(image_bytes, max_side=MODEL_INPUT_SIZE, quality=INFERENCE_JPEG_QUALITY):
+    """無法解碼時原樣回傳，交由模型端判斷。"""
+    started = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        # draft() 會改變 image.size，必須先記下原圖尺寸才能判斷是否需要縮小
+        original_size = image.size
+        needs_resize = max(original_size) > max_side
+        needs_transpose = image.getexif().get(_EXIF_ORIENTATION, 1) != 1
+        if image.format == 'JPEG' and not needs_resize and not needs_transpose:
+            # 已經是夠小且方向正確的 JPEG，重新編碼只會損失畫質
+            return PreparedImage(
+                image_bytes, image, len(image_bytes), _elapsed_ms(started), original_size, original_size
+            )
+        # JPEG 可在解碼時直接以 DCT 縮放，大幅減少解碼成本
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        if needs_resize:
+            image.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality)
+        data = buffer.getvalue()
+    except Exception as e:
+        print(f"影像前處理失敗，改用原始檔案: {e}")
+        return PreparedImage(image_bytes, None, len(image_bytes), _elapsed_ms(started))
+    return PreparedImage(data, image, len(image_bytes), _elapsed_ms(started), original_size, image.size)
+
+
+@timed('frame_encode')
+def encode_frame(frame, max_side=MODEL_INPUT_SIZE, quality=INFERENCE_JPEG_QUALITY):
+    """影片幀（BGR ndarray）縮到模型輸入尺寸後編碼成 JPEG 位元組。"""
+    # 只有影片與串流用到 cv2（呼叫端早已載入），圖片偵測不必為此付出匯入成本
+    import cv2
+
+    height, width = frame.shape[:2]
+    if max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        frame = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    _, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def _box(detection):
+    """支援 box / bbox 為 [x1, y1, x2, y2] 或含 x1/y1/x2/y2（xmin/ymin/xmax/ymax）的 dict。"""
+    box = detection.get('box') or detection.get('bbox')
+    if isinstance(box, (list, tuple)) and len(box) == 4:
+        return [float(v) for v in box]
+    if isinstance(box, dict):
+        for keys in (('x1', 'y1', 'x2', 'y2'), ('xmin', 'ymin', 'xmax', 'ymax')):
+            if all(k in box for k in keys):
+                return [float(box[k]) for k in keys]
+    return None
+
+
+def annotated_thumbnail(prepared, detections, max_side=THUMBNAIL_SIZE, quality=THUMBNAIL_JPEG_QUALITY):
+    """在正規化後的影像上畫出偵測框，縮成小縮圖後回傳 base64 JPEG；無影像時回傳 None。"""
+    if prepared.image is None:
+        return None
+    image = prepared.image.convert('RGB')
+    # 偵測框是送給模型的影像（prepared.size）上的座標，換算到繪製用的影像上
+    scale_x = image.width / prepared.size[0]
+    scale_y = image.height / prepared.size[1]
+    draw = ImageDraw.Draw(image)
+    line_width = max(2, max(image.size) // 160)
+    for detection in detections or []:
+        if not isinstance(detection, dict):
+            continue
+        box = _box(detection)
+        if box is None:
+            continue
+        box = [box[0] * scale_x, box[1] * scale_y, box[2] * scale_x, box[3] * scale_y]
+        color = (255, 64, 64) if detection.get('label') == 'kumay' else (255, 200, 0)
+        draw.rectangle(box, outline=color, width=line_width)
+        label = f"{detection.get('label', '')} {detection.get('confidence', 0):.0%}"
+        draw.text((box[0] + line_width, box[1] + line_width), label, fill=color)
+    image.thumbnail((max_side, max_side), Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
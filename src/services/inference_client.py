@@ -0,0 +1,185 @@
+# src/services/inference_client.py
+# 所有偵測路徑共用的 Hugging Face 推論用戶端：保持連線、逾時、5xx/429 重試與斷路器。
+
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.services.metrics import timed
+
+DEFAULT_API_URL = "https://ladyzoe-bear-detector-api-docker.hf.space/predict"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class InferenceError(Exception):
+    pass
+
+
+class CircuitOpenError(InferenceError):
+    """斷路器開啟中（模型服務冷啟動或故障），不送出請求直接失敗。"""
+
+
+class CircuitBreaker:
+    """連續失敗 failure_threshold 次後開啟，reset_timeout 秒後放行一個試探請求。"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class InferenceClient:
+    def __init__(self, api_url=DEFAULT_API_URL, api_token=None, connect_timeout=5.0, read_timeout=60.0,
+                 max_retries=2, backoff_base=0.5, backoff_max=8.0, pool_size=16, breaker=None, cache=None):
+        self.api_url = api_url
+        self.api_token = api_token
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.cache = cache
+        self.session = requests.Session()
+        # 重試由 predict 自行處理，adapter 只負責連線池
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if api_token:
+            self.session.headers['Authorization'] = f"Bearer {api_token}"
+
+    def _backoff(self, attempt, response=None):
+        """指數退避加上全抖動；429 有 Retry-After 時以其為準（不超過 backoff_max）。"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def predict(self, image_bytes, filename="upload.jpg", content_type="image/jpeg"):
+        """上傳圖片並回傳模型的 JSON 結果；失敗時拋出 requests 例外或 InferenceError。"""
+        if self.cache is None:
+            return self._request(image_bytes, filename, content_type)
+
+        # 相同（或近似）的圖片直接回傳快取結果，不再呼叫模型
+        cached, key, dhash_value = self.cache.get(image_bytes)
+        if cached is not None:
+            return cached
+        result = self._request(image_bytes, filename, content_type)
+        self.cache.put(key, result, dhash_value)
+        return result
+
+    def _request(self, image_bytes, filename, content_type):
+        if not self.breaker.allow():
+            raise CircuitOpenError("Hugging Face API 暫時無法使用（斷路器開啟中）")
+
+        attempt = 0
+        while True:
+            response = None
+            try:
+                with timed('hf_request'):
+                    response = self.session.post(
+                        self.api_url,
+                        files={'file': (filename, image_bytes, content_type)},
+                        timeout=self.timeout,
+                    )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    result = response.json()
+                    self.breaker.record_success()
+                    return result
+                error = requests.exceptions.HTTPError(
+                    f"{response.status_code} Server Error for url: {self.api_url}", response=response
+                )
+            except requests.exceptions.HTTPError:
+                # 其他 4xx 是請求本身的問題，重試也不會成功，也不代表服務故障
+                self.breaker.record_success()
+                raise
+            except ValueError as e:
+                # 需在 RequestException 之前：requests 的 JSONDecodeError 同時是兩者的子類別
+                self.breaker.record_failure()
+                raise InferenceError(f"無法解析 Hugging Face API 回應: {e}")
+            except requests.exceptions.RequestException as e:
+                # 連線、逾時以及回應中斷（ChunkedEncodingError 等）都可重試
+                error = e
+            except BaseException:
+                # 任何其他例外也要記錄失敗，否則半開狀態的試探請求會一直佔著名額，斷路器永遠不會恢復
+                self.breaker.record_failure()
+                raise
+
+            if attempt >= self.max_retries:
+                self.breaker.record_failure()
+                raise error
+            time.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def configure_inference_client(**kwargs):
+    """以指定設定建立共用的用戶端（通常在 app 啟動時呼叫一次）。"""
+    global _client
+    with _client_lock:
+        _client = InferenceClient(**kwargs)
+    return _client
+
+
+def get_inference_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = InferenceClient(
+                    api_url=os.getenv("HF_API_URL", DEFAULT_API_URL), api_token=os.getenv("HF_API_TOKEN")
+                )
+    return _client
+
+
+def is_bear_detected(api_response):
+    if api_response and isinstance(api_response.get('detections'), list):
+        bear_detections = [item for item in api_response['detections'] if isinstance(item, dict) and item.get('label') == 'kumay']
+        if bear_detections:
+            highest_confidence = max(item.get('confidence', 0) for item in bear_detections)
+            return True, highest_confidence
+    return False, 0.0
@@ -0,0 +1,208 @@
+# src/services/metrics.py
+# 輕量的效能指標：各處理階段的耗時直方圖與計數器，以 Prometheus 文字格式輸出，不需要額外套件。
+# 指標只存在於目前的程序中（非同步影片工作的 worker 程序各自獨立，不會出現在主程序的 /metrics）。
+
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ContextDecorator
+
+# 以秒為單位的預設分桶，涵蓋單幀編碼（毫秒級）到整段影片分析（數十秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要標籤 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # 各分桶的個數（非累計）、總和、總數
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collect_fn):
+        """
+        collect_fn() 回傳 [(name, type, help, [(labels_dict, value), ...]), ...]，
+        用來輸出其他元件自己維護的統計（例如快取命中數），不必在熱路徑上重複計數。
+        """
+        with self._lock:
+            self._collectors.append(collect_fn)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect_fn in collectors:
+            try:
+                families = collect_fn()
+            except Exception as e:
+                print(f"指標收集失敗: {e}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'bear_stage_duration_seconds', "Time spent in each processing stage.", ('stage',)
+)
+
+# 目前請求的各階段耗時（Server-Timing 標頭用）；只記錄在請求的 context 中執行的階段，
+# 背景執行緒需以 contextvars.copy_context().run 執行才會算進去
+_request_timings = contextvars.ContextVar('bear_request_timings', default=None)
+_request_timings_lock = threading.Lock()
+
+
+class timed(ContextDecorator):
+    """
+    量測一個處理階段的耗時並記錄到 bear_stage_duration_seconds{stage=...}。
+
+    可作為 context manager（with timed('hf_request'): ...）或 decorator（@timed('csv_load')）。
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.started = None
+
+    def _recreate_cm(self):
+        # decorator 形式每次呼叫使用新的實例，多執行緒同時呼叫時才不會互相覆蓋開始時間
+        return timed(self.stage)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(elapsed, stage=self.stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            with _request_timings_lock:
+                timings[self.stage] = timings.get(self.stage, 0.0) + elapsed
+        return False
+
+
+def start_request_timings():
+    """開始收集目前請求的階段耗時。"""
+    _request_timings.set({})
+
+
+def finish_request_timings():
+    """結束收集並回傳 {stage: seconds}。"""
+    timings = _request_timings.get() or {}
+    _request_timings.set(None)
+    return timings
+
+
+def server_timing_header(timings, total=None):
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(entries)
+
+
+def render_metrics():
+    return REGISTRY.render()
@@ -0,0 +1,202 @@
+# src/services/onnx_detector.py
+# 本機 CPU 上的 ONNX 偵測後端（cv2.dnn）；只有 DETECTOR_BACKENDS 包含 onnx 時才會匯入，其他部署不必載入 cv2 與 numpy。
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from src.services.detectors import DetectorBackend
+from src.services.inference_client import InferenceError
+from src.services.metrics import timed
+
+# letterbox 補邊的顏色（與 YOLO 訓練時相同）
+_PAD_COLOR = (114, 114, 114)
+
+
+class _BatchRequest:
+    __slots__ = ('image', 'done', 'result', 'error')
+
+    def __init__(self, image):
+        self.image = image
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class OnnxDetector(DetectorBackend):
+    """
+    以 cv2.dnn 在本機 CPU 執行 YOLO 格式（v5 或 v8 輸出）的 ONNX 模型。
+
+    同時進行的 detect() 呼叫（例如影片分析的推論 worker）會合併成一次批次前向運算：
+    第一個呼叫者等待 batch_wait 秒讓其他請求加入，再一次處理最多 batch_size 張。
+    模型不支援動態批次時自動改為逐張推論。
+    """
+
+    name = 'onnx'
+
+    def __init__(self, model_path, labels=('kumay',), input_size=640, confidence_threshold=0.25,
+                 nms_threshold=0.45, batch_size=8, batch_wait=0.005):
+        self.model_path = model_path
+        self.labels = list(labels)
+        self.input_size = input_size
+        self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.forward_passes = 0
+        self.images_processed = 0
+        self._net = None
+        self._load_error = None
+        self._net_lock = threading.Lock()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._batch_running = False
+
+    @property
+    def available(self):
+        return self._load_net() is not None
+
+    def _load_net(self):
+        if self._net is None and self._load_error is None:
+            with self._net_lock:
+                if self._net is None and self._load_error is None:
+                    try:
+                        self._net = cv2.dnn.readNetFromONNX(self.model_path)
+                        print(f"Loaded ONNX detector from {self.model_path}")
+                    except cv2.error as e:
+                        self._load_error = e
+                        print(f"無法載入 ONNX 模型 {self.model_path}: {e}")
+        return self._net
+
+    def detect(self, image_bytes, filename="upload.jpg", content_type="image/jpeg"):
+        if self._load_net() is None:
+            raise InferenceError(f"ONNX 模型無法使用: {self._load_error}")
+        image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise InferenceError("無法解碼圖片")
+
+        request = _BatchRequest(image)
+        with self._pending_lock:
+            self._pending.append(request)
+            leader = not self._batch_running
+            self._batch_running = True
+        if leader:
+            self._run_batches()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _run_batches(self):
+        # 由第一個呼叫者代為處理所有排隊中的請求，直到佇列清空為止
+        time.sleep(self.batch_wait)
+        while True:
+            with self._pending_lock:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                if not batch:
+                    self._batch_running = False
+                    return
+            try:
+                results = self._forward([request.image for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                error = e if isinstance(e, InferenceError) else InferenceError(f"ONNX 推論失敗: {e}")
+                for request in batch:
+                    request.error = error
+            for request in batch:
+                request.done.set()
+
+    def _letterbox(self, image):
+        height, width = image.shape[:2]
+        scale = min(self.input_size / width, self.input_size / height)
+        resized_w, resized_h = round(width * scale), round(height * scale)
+        pad_x = (self.input_size - resized_w) // 2
+        pad_y = (self.input_size - resized_h) // 2
+        resized = cv2.resize(image, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+        padded = cv2.copyMakeBorder(
+            resized, pad_y, self.input_size - resized_h - pad_y, pad_x, self.input_size - resized_w - pad_x,
+            cv2.BORDER_CONSTANT, value=_PAD_COLOR,
+        )
+        return padded, scale, pad_x, pad_y
+
+    def _forward(self, images):
+        letterboxed = [self._letterbox(image) for image in images]
+        blob = cv2.dnn.blobFromImages(
+            [padded for padded, _, _, _ in letterboxed], 1 / 255.0, (self.input_size, self.input_size), swapRB=True
+        )
+        with self._net_lock:
+            outputs = None
+            try:
+                with timed('onnx_forward'):
+                    self._net.setInput(blob)
+                    outputs = self._net.forward()
+                self.forward_passes += 1
+            except cv2.error:
+                if len(images) == 1:
+                    raise
+            if outputs is None or len(outputs) != len(images):
+                # 匯出時固定 batch=1 的模型：之後都逐張推論
+                print("ONNX 模型不支援批次輸入，改為逐張推論")
+                self.batch_size = 1
+                outputs = []
+                for i in range(len(images)):
+                    self._net.setInput(blob[i:i + 1])
+                    outputs.append(self._net.forward()[0])
+                    self.forward_passes += 1
+            self.images_processed += len(images)
+        return [
+            self._parse(output, image.shape, *letterbox[1:])
+            for output, image, letterbox in zip(outputs, images, letterboxed)
+        ]
+
+    def _parse(self, output, shape, scale, pad_x, pad_y):
+        """把一張影像的模型輸出轉成 detections；支援 YOLOv8 (4+nc, N) 與 YOLOv5 (N, 5+nc) 兩種排列。"""
+        class_count = len(self.labels)
+        if output.shape[1] not in (4 + class_count, 5 + class_count):
+            output = output.T
+        if output.shape[1] == 5 + class_count:
+            scores = output[:, 5:] * output[:, 4:5]
+        else:
+            scores = output[:, 4:4 + class_count]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences >= self.confidence_threshold
+        boxes, confidences, class_ids = output[keep, :4], confidences[keep], class_ids[keep]
+        if not len(boxes):
+            return {"detections": []}
+
+        # cx, cy, w, h（letterbox 後的像素）→ 原圖的 x1, y1, x2, y2
+        x1 = (boxes[:, 0] - boxes[:, 2] / 2 - pad_x) / scale
+        y1 = (boxes[:, 1] - boxes[:, 3] / 2 - pad_y) / scale
+        widths, heights = boxes[:, 2] / scale, boxes[:, 3] / scale
+        indices = cv2.dnn.NMSBoxesBatched(
+            np.stack([x1, y1, widths, heights], axis=1).tolist(), confidences.tolist(), class_ids.tolist(),
+            self.confidence_threshold, self.nms_threshold,
+        )
+        height, width = shape[:2]
+        detections = []
+        for i in np.asarray(indices).flatten():
+            detections.append({
+                'label': self.labels[class_ids[i]],
+                'confidence': round(float(confidences[i]), 4),
+                'box': [
+                    round(float(np.clip(x1[i], 0, width)), 1),
+                    round(float(np.clip(y1[i], 0, height)), 1),
+                    round(float(np.clip(x1[i] + widths[i], 0, width)), 1),
+                    round(float(np.clip(y1[i] + heights[i], 0, height)), 1),
+                ],
+            })
+        detections.sort(key=lambda d: d['confidence'], reverse=True)
+        return {"detections": detections}
+
+    def status(self):
+        return {
+            **super().status(),
+            'model_path': self.model_path,
+            'forward_passes': self.forward_passes,
+            'images_processed': self.images_processed,
+        }
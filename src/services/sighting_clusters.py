@@ -0,0 +1,100 @@
+# src/services/sighting_clusters.py
+# 伺服器端依縮放等級分群：對目擊座標建立一次四分樹式的網格階層，查詢時只回傳畫面上各格的彙總。
+
+import math
+
+import numpy as np
+
+# 最細的縮放等級；更低等級的格子由此右移位元取得
+MAX_ZOOM = 20
+# 每個分群格子在螢幕上的邊長（像素），需為 2 的次方才能逐層對齊
+CELL_PIXELS = 64
+TILE_PIXELS = 256
+# 每個分群附帶的範例事件 ID 數量
+SAMPLE_SIZE = 3
+
+_MAX_LAT = 85.05112878
+
+
+def _world_coordinates(lats, lngs):
+    """經緯度轉成 Web Mercator 的 [0, 1) 世界座標。"""
+    x = (lngs + 180.0) / 360.0
+    sin_lat = np.sin(np.radians(np.clip(lats, -_MAX_LAT, _MAX_LAT)))
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return np.clip(x, 0, 1 - 1e-12), np.clip(y, 0, 1 - 1e-12)
+
+
+def _date_string(seconds):
+    return str(np.datetime64(seconds, 's').astype('datetime64[D]'))
+
+
+class ClusterIndex:
+    """每筆目擊在 MAX_ZOOM 的格子座標；等級 z 的格子是 (ix, iy) >> (MAX_ZOOM - z)。"""
+
+    def __init__(self, snapshot):
+        cells_per_axis = (1 << MAX_ZOOM) * TILE_PIXELS // CELL_PIXELS
+        x, y = _world_coordinates(snapshot.lats, snapshot.lngs)
+        self.ix = (x * cells_per_axis).astype(np.int64)
+        self.iy = (y * cells_per_axis).astype(np.int64)
+        self.seconds = snapshot.dates.astype(np.int64)
+
+    def cluster(self, sightings, zoom, bbox=None):
+        """彙總 sightings（日期區間切片）在 bbox 內、縮放等級 zoom 的分群。"""
+        snapshot = sightings.snapshot
+        lo, hi = sightings.lo, sightings.hi
+        indices = np.arange(lo, hi)
+        if bbox is not None:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            lats = snapshot.lats[lo:hi]
+            lngs = snapshot.lngs[lo:hi]
+            mask = (lngs >= min_lng) & (lngs <= max_lng) & (lats >= min_lat) & (lats <= max_lat)
+            indices = indices[mask]
+        if len(indices) == 0:
+            return []
+
+        shift = MAX_ZOOM - zoom
+        keys = ((self.ix[indices] >> shift) << 32) | (self.iy[indices] >> shift)
+        # 依格子排序（穩定排序保留日期順序），每一段連續區間就是一個分群
+        order = np.argsort(keys, kind='stable')
+        indices = indices[order]
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        counts = np.diff(np.r_[starts, len(keys)])
+
+        lat_sums = np.add.reduceat(snapshot.lats[indices], starts)
+        lng_sums = np.add.reduceat(snapshot.lngs[indices], starts)
+        seconds = self.seconds[indices]
+        first_seconds = np.minimum.reduceat(seconds, starts)
+        last_seconds = np.maximum.reduceat(seconds, starts)
+
+        clusters = []
+        for start, count, lat_sum, lng_sum, first, last in zip(
+            starts.tolist(), counts.tolist(), lat_sums.tolist(), lng_sums.tolist(),
+            first_seconds.tolist(), last_seconds.tolist(),
+        ):
+            # 取該格最近的幾筆事件作為範例
+            sample = indices[start + max(0, count - SAMPLE_SIZE):start + count][::-1]
+            clusters.append({
+                "lat": round(lat_sum / count, 6),
+                "lng": round(lng_sum / count, 6),
+                "count": count,
+                "start": _date_string(first),
+                "end": _date_string(last),
+                "sample_ids": [snapshot.id_list[i] for i in sample.tolist()],
+            })
+        return clusters
+
+
+def get_cluster_index(snapshot):
+    return snapshot.derived('cluster_index', ClusterIndex)
+
+
+def parse_bbox(value):
+    """解析 "minLng,minLat,maxLng,maxLat"（與 Leaflet 的 toBBoxString 相同順序）。"""
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError("bbox 需要四個數值")
+    min_lng, min_lat, max_lng, max_lat = parts
+    if min_lng > max_lng or min_lat > max_lat:
+        raise ValueError("bbox 的最小值不可大於最大值")
+    return min_lng, min_lat, max_lng, max_lat
@@ -0,0 +1,93 @@
+# src/services/sighting_density.py
+# 熱點圖用的密度網格：每月一張 2D 直方圖，沿時間軸存成累積和，任意月份區間只需一次陣列相減。
+
+import numpy as np
+
+# 台灣本島與澎湖的經緯度範圍 (min_lng, min_lat, max_lng, max_lat)
+TAIWAN_BBOX = (119.3, 21.8, 122.1, 25.4)
+# 可選的網格解析度（度）；限制選項以控制每份快照的記憶體用量
+CELL_SIZES = (0.01, 0.02, 0.05, 0.1, 0.25)
+DEFAULT_CELL_SIZE = 0.05
+
+
+def _month_number(dates):
+    """datetime64 陣列轉成自西元 1970 年起算的月份序號。"""
+    return dates.astype('datetime64[M]').astype(np.int64)
+
+
+def _month_string(month_number):
+    return str(np.datetime64(int(month_number), 'M'))
+
+
+class DensityGrid:
+    """prefix[k] 為前 k 個月份的直方圖總和，形狀為 (月份數 + 1, ny, nx)。"""
+
+    def __init__(self, snapshot, cell_size, bbox=TAIWAN_BBOX):
+        self.cell_size = cell_size
+        self.bbox = bbox
+        min_lng, min_lat, max_lng, max_lat = bbox
+        self.nx = int(np.ceil((max_lng - min_lng) / cell_size))
+        self.ny = int(np.ceil((max_lat - min_lat) / cell_size))
+
+        lats, lngs = snapshot.lats, snapshot.lngs
+        inside = (lngs >= min_lng) & (lngs < max_lng) & (lats >= min_lat) & (lats < max_lat)
+        months = _month_number(snapshot.dates[inside])
+        if len(months):
+            self.first_month = int(months.min())
+            self.month_count = int(months.max()) - self.first_month + 1
+        else:
+            self.first_month = 0
+            self.month_count = 0
+
+        # 加上微小偏移，避免剛好落在格線上的座標因浮點誤差被分到前一格
+        ix = np.minimum(((lngs[inside] - min_lng) / cell_size + 1e-9).astype(np.int64), self.nx - 1)
+        iy = np.minimum(((lats[inside] - min_lat) / cell_size + 1e-9).astype(np.int64), self.ny - 1)
+        prefix = np.zeros((self.month_count + 1, self.ny, self.nx), dtype=np.int32)
+        np.add.at(prefix, (months - self.first_month + 1, iy, ix), 1)
+        np.cumsum(prefix, axis=0, out=prefix)
+        self.prefix = prefix
+
+    def month_window(self, start_dt=None, end_dt=None):
+        """日期區間對齊到整月後的 prefix 索引 [a, b)。"""
+        a = 0
+        b = self.month_count
+        if start_dt is not None:
+            a = int(_month_number(np.datetime64(start_dt, 'D'))) - self.first_month
+        if end_dt is not None:
+            b = int(_month_number(np.datetime64(end_dt, 'D'))) - self.first_month + 1
+        a = min(max(a, 0), self.month_count)
+        b = min(max(b, a), self.month_count)
+        return a, b
+
+    def counts(self, start_dt=None, end_dt=None):
+        a, b = self.month_window(start_dt, end_dt)
+        return self.prefix[b] - self.prefix[a], (a, b)
+
+    def to_payload(self, start_dt=None, end_dt=None):
+        grid, (a, b) = self.counts(start_dt, end_dt)
+        iy, ix = np.nonzero(grid)
+        values = grid[iy, ix]
+        min_lng, min_lat, _, _ = self.bbox
+        half = self.cell_size / 2
+        cells = np.column_stack([
+            np.round(min_lat + iy * self.cell_size + half, 6),
+            np.round(min_lng + ix * self.cell_size + half, 6),
+            values,
+        ])
+        return {
+            "success": True,
+            "cell_size": self.cell_size,
+            "bbox": list(self.bbox),
+            "start_month": _month_string(self.first_month + a) if b > a else None,
+            "end_month": _month_string(self.first_month + b - 1) if b > a else None,
+            "total": int(values.sum()),
+            "max": int(values.max()) if len(values) else 0,
+            # 每格為 [lat, lng, count]，只列出非零格子
+            "cells": [[lat, lng, int(count)] for lat, lng, count in cells.tolist()],
+        }
+
+
+def get_density_grid(snapshot, cell_size=DEFAULT_CELL_SIZE):
+    if cell_size not in CELL_SIZES:
+        raise ValueError(f"cell 只接受 {', '.join(str(c) for c in CELL_SIZES)}")
+    return snapshot.derived(('density', cell_size), lambda s: DensityGrid(s, cell_size))
@@ -0,0 +1,95 @@
+# src/services/sighting_index.py
+# 以 SQLite R*Tree 持久化的目擊資料索引：多個 worker 程序共用同一個資料庫檔，不必各自載入 DataFrame。
+
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, text
+
+from src.models.sighting import Sighting, SIGHTING_RTREE_DDL
+from src.models.user import db
+from src.services.sighting_store import SightingRows, make_etag, read_sightings_csv
+
+# julianday('1970-01-01')，用來把日期換算成 R*Tree 的日數座標
+_UNIX_EPOCH_JULIAN_DAY = 2440587.5
+_UNBOUNDED = 1e9
+
+_SYNC_RTREE_SQL = text(f"""
+    INSERT INTO sighting_rtree (id, min_lng, max_lng, min_lat, max_lat, min_day, max_day)
+    SELECT id, lng, lng, lat, lat,
+           julianday(eventdate) - {_UNIX_EPOCH_JULIAN_DAY},
+           julianday(eventdate) - {_UNIX_EPOCH_JULIAN_DAY}
+    FROM sighting
+    WHERE id > :after_id
+""")
+
+# R*Tree 以 32 位元浮點數向外取整儲存座標，所以先用重疊條件找候選，再以原始座標精確篩選
+_QUERY_SQL = text("""
+    SELECT s.occurrenceid, s.eventdate, s.lat, s.lng
+    FROM sighting_rtree AS r JOIN sighting AS s ON s.id = r.id
+    WHERE r.max_day >= :start_day AND r.min_day <= :end_day
+      AND r.max_lng >= :min_lng AND r.min_lng <= :max_lng
+      AND r.max_lat >= :min_lat AND r.min_lat <= :max_lat
+      AND s.lng BETWEEN :min_lng AND :max_lng
+      AND s.lat BETWEEN :min_lat AND :max_lat
+    ORDER BY s.eventdate, s.id
+""")
+
+
+def _epoch_day(dt):
+    return (dt.date() - datetime(1970, 1, 1).date()).days
+
+
+def ensure_sighting_index():
+    db.create_all()
+    db.session.execute(text(SIGHTING_RTREE_DDL))
+    db.session.commit()
+
+
+def ingest_csv(csv_path, encoding=None):
+    """把 CSV 追加進 sighting 表，occurrenceid 已存在的列會略過；回傳新增筆數。"""
+    ensure_sighting_index()
+    df = read_sightings_csv(csv_path, encoding=encoding)
+    rows = [
+        {"occurrenceid": occurrence_id, "eventdate": eventdate.date(), "lat": lat, "lng": lng}
+        for occurrence_id, eventdate, lat, lng in zip(
+            df['occurrenceid'].astype(str), df['eventdate'], df['verbatimlatitude'], df['verbatimlongitude'],
+        )
+    ]
+
+    last_id = db.session.query(db.func.max(Sighting.id)).scalar() or 0
+    if rows:
+        db.session.execute(insert(Sighting).prefix_with('OR IGNORE'), rows)
+    # 只替新插入的列建立索引，不需要整個重建
+    db.session.execute(_SYNC_RTREE_SQL, {"after_id": last_id})
+    db.session.commit()
+    return db.session.query(Sighting).filter(Sighting.id > last_id).count()
+
+
+class SqliteSightingIndex:
+    """/api/map 在 SIGHTINGS_BACKEND=sqlite 時使用的查詢介面，需在 app context 中呼叫。"""
+
+    def state(self):
+        """回傳 (version, last_modified)；每次匯入都會讓最新一列改變。"""
+        latest = db.session.query(Sighting.id, Sighting.ingested_at).order_by(Sighting.id.desc()).first()
+        if latest is None:
+            return "empty", datetime.fromtimestamp(0, timezone.utc)
+        return latest.id, latest.ingested_at.replace(tzinfo=timezone.utc, microsecond=0)
+
+    def etag(self, version, *parts):
+        return make_etag(f"sqlite:{version}", *parts)
+
+    def query(self, start_dt=None, end_dt=None, bbox=None):
+        min_lng, min_lat, max_lng, max_lat = bbox or (-_UNBOUNDED, -_UNBOUNDED, _UNBOUNDED, _UNBOUNDED)
+        params = {
+            "start_day": _epoch_day(start_dt) if start_dt else -_UNBOUNDED,
+            "end_day": _epoch_day(end_dt) if end_dt else _UNBOUNDED,
+            "min_lng": min_lng, "max_lng": max_lng,
+            "min_lat": min_lat, "max_lat": max_lat,
+        }
+        result = db.session.execute(_QUERY_SQL, params).all()
+        return SightingRows(
+            ids=[row[0] for row in result],
+            dates=[str(row[1]) for row in result],
+            lats=[row[2] for row in result],
+            lngs=[row[3] for row in result],
+        )
@@ -0,0 +1,225 @@
+# src/services/sighting_store.py
+# 黑熊目擊資料的常駐記憶體索引：啟動時讀取一次 CSV，依日期排序後以二分搜尋回答日期區間查詢。
+
+import os
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from src.services.metrics import timed
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '台灣黑熊.csv')
+
+# 只讀取地圖需要的欄位
+CSV_COLUMNS = ['occurrenceid', 'eventdate', 'verbatimlatitude', 'verbatimlongitude']
+
+
+def popup_html(occurrence_id, date):
+    return f"""
+                    <b>事件ID:</b> {occurrence_id}<br>
+                    <b>日期:</b> {date}<br>
+                """
+
+
+def make_etag(version, *parts):
+    key = ":".join([str(version)] + [str(p) for p in parts])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+class SightingRows:
+    """已篩選好的目擊資料（各欄位為 list），提供與 SightingSlice 相同的序列化介面。"""
+
+    def __init__(self, ids, dates, lats, lngs):
+        self.ids = ids
+        self.dates = dates
+        self.lats = lats
+        self.lngs = lngs
+
+    def __len__(self):
+        return len(self.ids)
+
+    def to_columnar(self):
+        return {"occurrenceid": self.ids, "eventdate": self.dates, "lat": self.lats, "lng": self.lngs}
+
+    def to_locations(self):
+        return [
+            {"lat": lat, "lng": lng, "popup_html": popup_html(occurrence_id, date)}
+            for occurrence_id, date, lat, lng in zip(self.ids, self.dates, self.lats, self.lngs)
+        ]
+
+
+class SightingSlice:
+    """快照中某個日期區間 [lo, hi) 的資料視圖，不複製底層陣列。"""
+
+    def __init__(self, snapshot, lo, hi):
+        self.snapshot = snapshot
+        self.lo = lo
+        self.hi = hi
+
+    def __len__(self):
+        return self.hi - self.lo
+
+    @property
+    def lats(self):
+        return self.snapshot.lats[self.lo:self.hi]
+
+    @property
+    def lngs(self):
+        return self.snapshot.lngs[self.lo:self.hi]
+
+    @property
+    def dates(self):
+        return self.snapshot.dates[self.lo:self.hi]
+
+    @property
+    def ids(self):
+        return self.snapshot.ids[self.lo:self.hi]
+
+    def within(self, bbox):
+        """再以 (min_lng, min_lat, max_lng, max_lat) 篩選，回傳 SightingRows。"""
+        min_lng, min_lat, max_lng, max_lat = bbox
+        lats, lngs = self.lats, self.lngs
+        mask = (lngs >= min_lng) & (lngs <= max_lng) & (lats >= min_lat) & (lats <= max_lat)
+        s = self.snapshot
+        indices = (np.flatnonzero(mask) + self.lo).tolist()
+        return SightingRows(
+            ids=[s.id_list[i] for i in indices],
+            dates=[s.date_list[i] for i in indices],
+            lats=[s.lat_list[i] for i in indices],
+            lngs=[s.lng_list[i] for i in indices],
+        )
+
+    def to_columnar(self):
+        s = self.snapshot
+        return {
+            "occurrenceid": s.id_list[self.lo:self.hi],
+            "eventdate": s.date_list[self.lo:self.hi],
+            "lat": s.lat_list[self.lo:self.hi],
+            "lng": s.lng_list[self.lo:self.hi],
+        }
+
+    def to_locations(self):
+        s = self.snapshot
+        return [
+            {"lat": lat, "lng": lng, "popup_html": popup}
+            for lat, lng, popup in zip(
+                s.lat_list[self.lo:self.hi],
+                s.lng_list[self.lo:self.hi],
+                s.popup_list[self.lo:self.hi],
+            )
+        ]
+
+
+class SightingSnapshot:
+    """某一版 CSV 的不可變內容：各欄位為依 eventdate 排序的陣列。"""
+
+    def __init__(self, ids, dates, lats, lngs, mtime_ns, size):
+        self.ids = ids
+        self.dates = dates
+        self.lats = lats
+        self.lngs = lngs
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.last_modified = datetime.fromtimestamp(mtime_ns / 1e9, timezone.utc).replace(microsecond=0)
+        self.version = hashlib.sha1(f"{mtime_ns}:{size}:{len(ids)}".encode()).hexdigest()[:16]
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+        # 預先轉成 Python 物件，序列化時只需切片
+        self.id_list = ids.tolist()
+        self.date_list = np.datetime_as_string(dates, unit='D').tolist()
+        self.lat_list = lats.tolist()
+        self.lng_list = lngs.tolist()
+        self.popup_list = [popup_html(occurrence_id, date) for occurrence_id, date in zip(self.id_list, self.date_list)]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def date_range(self, start_dt=None, end_dt=None):
+        """回傳 eventdate 落在 [start_dt, end_dt] 的索引區間 (lo, hi)。"""
+        lo = 0
+        hi = len(self.dates)
+        if start_dt is not None:
+            lo = int(np.searchsorted(self.dates, np.datetime64(start_dt, 's'), side='left'))
+        if end_dt is not None:
+            hi = int(np.searchsorted(self.dates, np.datetime64(end_dt, 's'), side='right'))
+        return lo, max(lo, hi)
+
+    def query(self, start_dt=None, end_dt=None):
+        lo, hi = self.date_range(start_dt, end_dt)
+        return SightingSlice(self, lo, hi)
+
+    def derived(self, key, build):
+        """快取由此快照衍生的索引（例如分群網格），CSV 重新載入後自然失效。"""
+        value = self._derived.get(key)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = build(self)
+                    self._derived[key] = value
+        return value
+
+    def etag(self, *parts):
+        return make_etag(self.version, *parts)
+
+
+def read_sightings_csv(csv_path, encoding=None):
+    """讀取並清理 CSV 中地圖需要的欄位，丟棄日期或座標無法解析的列。"""
+    df = pd.read_csv(csv_path, usecols=CSV_COLUMNS, encoding=encoding)
+    df['eventdate'] = pd.to_datetime(df['eventdate'], errors='coerce')
+    df['verbatimlatitude'] = pd.to_numeric(df['verbatimlatitude'], errors='coerce')
+    df['verbatimlongitude'] = pd.to_numeric(df['verbatimlongitude'], errors='coerce')
+    df.dropna(subset=['eventdate', 'verbatimlatitude', 'verbatimlongitude'], inplace=True)
+    return df
+
+
+@timed('csv_load')
+def load_snapshot(csv_path):
+    stat = os.stat(csv_path)
+    df = read_sightings_csv(csv_path)
+    dates = df['eventdate'].to_numpy().astype('datetime64[s]')
+    order = np.argsort(dates, kind='stable')
+    return SightingSnapshot(
+        ids=df['occurrenceid'].astype(str).to_numpy(dtype=object)[order],
+        dates=dates[order],
+        lats=df['verbatimlatitude'].to_numpy(dtype=np.float64)[order],
+        lngs=df['verbatimlongitude'].to_numpy(dtype=np.float64)[order],
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+    )
+
+
+class SightingStore:
+    """持有目前的快照，CSV 的 mtime 或大小改變時自動重新載入。"""
+
+    def __init__(self, csv_path=DEFAULT_CSV_PATH):
+        self.csv_path = csv_path
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        snapshot = load_snapshot(self.csv_path)
+        with self._lock:
+            self._snapshot = snapshot
+        print(f"Sighting store loaded {len(snapshot)} records from {self.csv_path}")
+        return snapshot
+
+    def snapshot(self):
+        stat = os.stat(self.csv_path)
+        current = self._snapshot
+        if current is not None and current.mtime_ns == stat.st_mtime_ns and current.size == stat.st_size:
+            return current
+        with self._lock:
+            current = self._snapshot
+            if current is not None and current.mtime_ns == stat.st_mtime_ns and current.size == stat.st_size:
+                return current
+            self._snapshot = load_snapshot(self.csv_path)
+            print(f"Sighting store {'reloaded' if current else 'loaded'} {len(self._snapshot)} records from {self.csv_path}")
+            return self._snapshot
+
+    def query(self, start_dt=None, end_dt=None):
+        return self.snapshot().query(start_dt, end_dt)
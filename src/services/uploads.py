@@ -0,0 +1,30 @@
+# src/services/uploads.py
+# 上傳檔案以固定大小的區塊寫入磁碟，避免把整個影片讀進 worker 的記憶體。
+
+import os
+import shutil
+import tempfile
+
+from src.services.metrics import timed
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+@timed('temp_write')
+def save_stream(stream, suffix="", directory=None):
+    """把可讀的串流分塊寫入暫存檔，回傳檔案路徑；呼叫端負責刪除。"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=directory) as temp:
+        shutil.copyfileobj(stream, temp, UPLOAD_CHUNK_SIZE)
+        return temp.name
+
+
+def save_upload(file_storage, suffix="", directory=None):
+    return save_stream(file_storage.stream, suffix=suffix, directory=directory)
+
+
+def remove_temp(path):
+    """刪除暫存檔或暫存資料夾。"""
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        os.remove(path)
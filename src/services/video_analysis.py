@@ -0,0 +1,313 @@
+# src/services/video_analysis.py
+# 影片逐幀偵測的管線：解碼/編碼由生產者執行緒負責，推論交給 worker 池並行，結果依幀序重新排列。
+
+import contextvars
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from src.services.image_preprocess import encode_frame
+from src.services.metrics import REGISTRY, timed
+from src.services.video_sampling import AdaptiveVideoScanner
+
+_END = object()
+
+ALERT_THRESHOLD_SECONDS = 3.0  # 恢復為 3 秒
+FRAMES_TO_PROCESS_PER_SECOND = 1 # 保持較低的抽幀率以優化性能
+
+# 計算畫面變化時使用的縮圖大小
+MOTION_FRAME_SIZE = (64, 36)
+# 畫面持續不變時，最多連續沿用幾個抽樣幀的結果就強制重新推論一次
+MAX_REUSED_FRAMES = 10
+
+VIDEO_INFERENCE_CALLS = REGISTRY.histogram(
+    'bear_video_inference_calls', "Inference calls made per analyzed video.", ('sampling',),
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+VIDEO_INFERENCE_CALLS_SAVED = REGISTRY.counter(
+    'bear_video_inference_calls_saved_total', "Sampled frames whose inference was skipped.", ('sampling',)
+)
+
+
+def motion_thumbnail(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, MOTION_FRAME_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def motion_score(previous, current):
+    """
+    兩張縮圖中變化最大之處的絕對差（0-255）。
+
+    不取整張的平均：遠處的小型動物只占畫面一小塊，平均後幾乎看不出變化。
+    縮圖本身已以 INTER_AREA 取區塊平均，雜訊不會讓最大值失真。
+    """
+    return float(cv2.absdiff(previous, current).max())
+
+
+class ConsecutiveDetectionTracker:
+    """連續偵測規則：連續 consecutive_frames_needed 個抽樣幀都有偵測到黑熊時觸發警報。"""
+
+    def __init__(self, frames_to_process_per_second, consecutive_frames_needed):
+        self.frames_to_process_per_second = frames_to_process_per_second
+        self.consecutive_frames_needed = consecutive_frames_needed
+        self.consecutive_bear_frames = 0
+        self.max_consecutive_duration = 0.0
+        self.highest_confidence = 0.0
+
+    @property
+    def current_duration(self):
+        return self.consecutive_bear_frames / self.frames_to_process_per_second
+
+    def update(self, detected, confidence):
+        """依幀序餵入一個抽樣幀的結果；達到警報門檻時回傳 True。"""
+        if detected:
+            self.consecutive_bear_frames += 1
+            self.highest_confidence = max(self.highest_confidence, confidence)
+        else:
+            self.max_consecutive_duration = max(self.max_consecutive_duration, self.current_duration)
+            self.consecutive_bear_frames = 0
+        return self.consecutive_bear_frames >= self.consecutive_frames_needed
+
+    def finish(self):
+        self.max_consecutive_duration = max(self.max_consecutive_duration, self.current_duration)
+        return self.max_consecutive_duration
+
+
+class FramePipeline:
+    """
+    依幀序產生 (frame_index, (detected, confidence))。
+
+    生產者執行緒每 frames_to_skip 幀取一幀並 JPEG 編碼後放入有界佇列，
+    未抽樣的幀只 grab() 不解碼；最多 workers 個推論同時進行；
+    close() 會取消尚未開始的推論並停止解碼。
+
+    motion_threshold > 0 時，與上一個抽樣幀相比變化低於門檻的抽樣幀不再推論，直接沿用上一個結果；
+    與上一個抽樣幀（而不是上一個推論的幀）比較，物體出現或離開的那一幀一定會重新推論。
+    """
+
+    def __init__(self, cap, classify_fn, frames_to_skip, workers=4, queue_size=None, motion_threshold=0.0):
+        self.cap = cap
+        self.classify_fn = classify_fn
+        self.frames_to_skip = frames_to_skip
+        self.motion_threshold = motion_threshold
+        self.inference_calls = 0
+        self.inference_calls_saved = 0
+        self.workers = max(1, workers)
+        self.frames = queue.Queue(maxsize=queue_size or self.workers * 2)
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='frame-inference')
+        self._in_flight = deque()
+        # 在建立者的 context 中執行，解碼與推論的耗時才會算進該請求的 Server-Timing
+        self._producer = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._produce,), name='frame-decoder', daemon=True
+        )
+
+    def __enter__(self):
+        self._producer.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        frame_count = 0
+        previous = None
+        reused = 0
+        try:
+            while not self._stop.is_set() and self.cap.isOpened():
+                if not self.cap.grab(): break
+
+                frame_count += 1
+                if frame_count % self.frames_to_skip != 0: continue
+
+                with timed('frame_decode'):
+                    ret, frame = self.cap.retrieve()
+                if not ret: break
+
+                if self.motion_threshold > 0:
+                    thumbnail = motion_thumbnail(frame)
+                    unchanged = previous is not None and motion_score(previous, thumbnail) < self.motion_threshold
+                    previous = thumbnail
+                    if unchanged and reused < MAX_REUSED_FRAMES:
+                        # 畫面沒有明顯變化：不編碼、不推論，交由消費端沿用上一個結果
+                        reused += 1
+                        if not self._put((frame_count, None)):
+                            return
+                        continue
+                    reused = 0
+
+                if not self._put((frame_count, encode_frame(frame))):
+                    return
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(_END)
+
+    def __iter__(self):
+        producer_done = False
+        last_future = None
+        while True:
+            # 補滿推論視窗；佇列的上限讓解碼不會跑得比推論快太多
+            while not producer_done and len(self._in_flight) < self.workers:
+                item = self.frames.get()
+                if item is _END:
+                    producer_done = True
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    frame_index, image_bytes = item
+                    if image_bytes is None:
+                        self._in_flight.append((frame_index, last_future, True))
+                    else:
+                        last_future = self._executor.submit(
+                            contextvars.copy_context().run, self.classify_fn, image_bytes
+                        )
+                        self._in_flight.append((frame_index, last_future, False))
+            if not self._in_flight:
+                return
+            frame_index, future, reused = self._in_flight.popleft()
+            if reused:
+                self.inference_calls_saved += 1
+            else:
+                self.inference_calls += 1
+            yield frame_index, future.result()
+
+    def close(self):
+        self._stop.set()
+        for _, future, _ in self._in_flight:
+            future.cancel()
+        self._in_flight.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        # 清空佇列讓生產者不會卡在 put
+        while True:
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                break
+        if self._producer.is_alive():
+            self._producer.join()
+
+
+def analyze_video_events(video_path, classify_fn, alert_fn, workers=4, motion_threshold=0.0,
+                         sampling='linear', coarse_interval=None):
+    """
+    分析影片並逐步產生事件 dict：start、frame / interval、alert，最後是 result 或 error。
+
+    classify_fn(image_bytes) 回傳 (detected, confidence)；alert_fn(confidence) 在達到警報門檻時呼叫一次。
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            yield {"event": "error", "error": "無法讀取影片檔案"}
+            return
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if fps == 0:
+            print("⚠️ FPS 無法讀取，使用預設 30 FPS")
+            fps = 30
+
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        duration_seconds = round(total_frames / fps, 2) if total_frames > 0 else None
+        frames_to_skip = max(1, int(fps / FRAMES_TO_PROCESS_PER_SECOND))
+        consecutive_frames_needed = int(ALERT_THRESHOLD_SECONDS * FRAMES_TO_PROCESS_PER_SECOND)
+
+        if sampling == 'adaptive':
+            scanner = AdaptiveVideoScanner(
+                cap, classify_fn, fps, frames_to_skip, FRAMES_TO_PROCESS_PER_SECOND, consecutive_frames_needed,
+                coarse_step=int(round((coarse_interval or ALERT_THRESHOLD_SECONDS) * FRAMES_TO_PROCESS_PER_SECOND)),
+                workers=workers,
+            )
+            # 讀不到總幀數時無法跳轉，退回逐幀抽樣
+            if scanner.sample_count > 0:
+                yield {"event": "start", "video_fps": fps, "duration_seconds": duration_seconds, "sampling": "adaptive"}
+                yield from _adaptive_events(scanner, fps, alert_fn)
+                return
+            print("⚠️ 無法取得影片總幀數，改用逐幀抽樣")
+
+        yield {"event": "start", "video_fps": fps, "duration_seconds": duration_seconds, "sampling": "linear"}
+        tracker = ConsecutiveDetectionTracker(FRAMES_TO_PROCESS_PER_SECOND, consecutive_frames_needed)
+        alert_sent = False
+
+        # 推論結果依幀序回來，連續偵測的判斷與逐幀處理時完全相同
+        with FramePipeline(cap, classify_fn, frames_to_skip,
+                           workers=workers, motion_threshold=motion_threshold) as pipeline:
+            for frame_index, (detected, confidence) in pipeline:
+                should_alert = tracker.update(detected, confidence)
+                yield {
+                    "event": "frame",
+                    "frame": frame_index,
+                    "time_seconds": round((frame_index - 1) / fps, 2),
+                    "detected": detected,
+                    "confidence": confidence,
+                    "consecutive_duration_seconds": tracker.current_duration,
+                }
+
+                if should_alert:
+                    alert_fn(tracker.highest_confidence)
+                    alert_sent = True
+                    print("🚨 即時觸發警報並停止分析")
+                    yield {"event": "alert", "confidence": tracker.highest_confidence}
+                    break
+
+        max_consecutive_duration = tracker.finish()
+        VIDEO_INFERENCE_CALLS.observe(pipeline.inference_calls, sampling='linear')
+        VIDEO_INFERENCE_CALLS_SAVED.inc(pipeline.inference_calls_saved, sampling='linear')
+
+        yield {
+            "event": "result",
+            "success": True,
+            "alert_sent": alert_sent,
+            "max_consecutive_duration_seconds": round(max_consecutive_duration, 2),
+            "video_fps": fps,
+            "inference_calls": pipeline.inference_calls,
+            "inference_calls_saved": pipeline.inference_calls_saved
+        }
+    finally:
+        cap.release()
+
+
+def _adaptive_events(scanner, fps, alert_fn):
+    intervals = []
+    alert_sent = False
+    for interval in scanner.iter_intervals():
+        intervals.append(interval)
+        yield {"event": "interval", **interval}
+        if interval["frames"] >= scanner.consecutive_frames_needed:
+            confidence = max(i["max_confidence"] for i in intervals)
+            alert_fn(confidence)
+            alert_sent = True
+            print("🚨 即時觸發警報並停止分析")
+            yield {"event": "alert", "confidence": confidence}
+            break
+
+    # 與逐幀抽樣實際會做的推論次數比較：逐幀抽樣在達到警報門檻的那一幀就停止
+    if alert_sent:
+        linear_calls = scanner.last_run[0] + scanner.consecutive_frames_needed
+    else:
+        linear_calls = scanner.sample_count
+    calls_saved = max(0, linear_calls - scanner.inference_calls)
+    VIDEO_INFERENCE_CALLS.observe(scanner.inference_calls, sampling='adaptive')
+    VIDEO_INFERENCE_CALLS_SAVED.inc(calls_saved, sampling='adaptive')
+    yield {
+        "event": "result",
+        "success": True,
+        "alert_sent": alert_sent,
+        "max_consecutive_duration_seconds": max((i["duration_seconds"] for i in intervals), default=0.0),
+        "video_fps": fps,
+        "sampling": "adaptive",
+        "detection_intervals": intervals,
+        "inference_calls": scanner.inference_calls,
+        "inference_calls_saved": calls_saved
+    }
@@ -0,0 +1,246 @@
+# src/services/video_jobs.py
+# 非同步影片分析工作：工作排在 SQLite 的 video_job 表中，由本機的 worker 程序池逐一領取執行，不需要外部 broker。
+
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, func, inspect, select, text, update
+from sqlalchemy.exc import OperationalError
+
+from src.models.video_job import VideoJob
+from src.models.user import db
+
+# 工作進度最多每隔幾秒寫回資料庫一次
+PROGRESS_WRITE_INTERVAL = 1.0
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def submit_job(video_path, options, max_queued):
+    """在 app context 中建立工作；排隊中的工作已達上限時拋出 JobQueueFull。"""
+    queued = db.session.query(func.count(VideoJob.id)).filter(VideoJob.status == 'queued').scalar()
+    if queued >= max_queued:
+        raise JobQueueFull()
+    job = VideoJob(id=uuid.uuid4().hex, status='queued', video_path=video_path, options=json.dumps(options))
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _create_engine(database_uri):
+    engine = create_engine(database_uri, connect_args={'timeout': 30})
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragma(dbapi_connection, _):
+        # WAL 讓 Flask 讀取工作狀態時不會被 worker 的寫入擋住
+        dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+    return engine
+
+
+def upgrade_schema(engine):
+    """較舊的資料庫中 video_job 表沒有 worker_id 欄位，create_all 不會補上既有資料表的欄位。"""
+    columns = {column['name'] for column in inspect(engine).get_columns('video_job')}
+    if 'worker_id' not in columns:
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE video_job ADD COLUMN worker_id VARCHAR(96)'))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _boot_id():
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _process_start_time(pid):
+    """程序的啟動時間（開機後的 clock ticks，/proc/<pid>/stat 第 22 欄）；無法取得時回傳 None。"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # 第 2 欄是可能含空白的程序名稱，從最後一個 ')' 之後開始切
+    return stat[stat.rindex(')') + 2:].split()[19]
+
+
+def worker_identity(pid):
+    """
+    開機 ID + PID + 程序啟動時間，用來辨識領取工作的 worker 程序。
+
+    容器重啟後 PID 常被重複使用（而且往往是同樣的小數字），只看 PID 是否存在會把當機的工作
+    誤判為仍在執行；加上啟動時間後，PID 被其他程序重用時身分就不再相符。
+    無法讀取 /proc 時（非 Linux）回傳 None，只能退回以 PID 判斷。
+    """
+    boot_id = _boot_id()
+    started = _process_start_time(pid)
+    if boot_id is None or started is None:
+        return None
+    return f"{boot_id}:{pid}:{started}"
+
+
+def _worker_alive(pid, worker_id):
+    if not pid or not _pid_alive(pid):
+        return False
+    if worker_id is None:
+        # 舊版資料或無法取得身分時，只能以 PID 判斷
+        return True
+    return worker_id == worker_identity(pid)
+
+
+def requeue_orphaned_jobs(engine):
+    """把執行中但領取它的 worker 程序已不存在的工作（例如伺服器或容器重啟）放回佇列。"""
+    with engine.begin() as conn:
+        running = conn.execute(
+            select(VideoJob.id, VideoJob.worker_pid, VideoJob.worker_id).where(VideoJob.status == 'running')
+        ).all()
+        orphaned = [job_id for job_id, pid, worker_id in running if not _worker_alive(pid, worker_id)]
+        if orphaned:
+            conn.execute(
+                update(VideoJob).where(VideoJob.id.in_(orphaned))
+                .values(status='queued', worker_pid=None, worker_id=None, progress=0.0, frames_processed=0)
+            )
+    return len(orphaned)
+
+
+def _claim_next_job(engine, worker_id):
+    next_id = (
+        select(VideoJob.id).where(VideoJob.status == 'queued')
+        .order_by(VideoJob.created_at).limit(1).scalar_subquery()
+    )
+    # 單一 UPDATE ... RETURNING 讓多個 worker 不會領到同一個工作
+    with engine.begin() as conn:
+        return conn.execute(
+            update(VideoJob)
+            .where(VideoJob.id == next_id, VideoJob.status == 'queued')
+            .values(status='running', worker_pid=os.getpid(), worker_id=worker_id, started_at=datetime.utcnow())
+            .returning(VideoJob.id, VideoJob.video_path, VideoJob.options)
+        ).first()
+
+
+def _update_job(engine, job_id, **values):
+    with engine.begin() as conn:
+        conn.execute(update(VideoJob).where(VideoJob.id == job_id).values(**values))
+
+
+def _run_job(engine, job, classify_fn, alert_fn):
+    # 影片分析（cv2）只在 worker 程序中需要，主程序提交工作時不必載入
+    from src.services.video_analysis import analyze_video_events
+
+    job_id, video_path, options = job
+    print(f"Video job {job_id} started in worker {os.getpid()}")
+    duration = None
+    frames_processed = 0
+    last_write = 0.0
+    try:
+        for analysis_event in analyze_video_events(video_path, classify_fn, alert_fn, **json.loads(options)):
+            kind = analysis_event["event"]
+            if kind == "start":
+                duration = analysis_event.get("duration_seconds")
+            elif kind in ("frame", "interval"):
+                frames_processed += analysis_event.get("frames", 1)
+                now = time.monotonic()
+                if now - last_write >= PROGRESS_WRITE_INTERVAL:
+                    position = analysis_event.get("time_seconds", analysis_event.get("end_seconds", 0.0))
+                    progress = min(0.99, position / duration) if duration else 0.0
+                    _update_job(engine, job_id, progress=progress, frames_processed=frames_processed)
+                    last_write = now
+            elif kind == "error":
+                _update_job(engine, job_id, status='failed', error=analysis_event["error"], finished_at=datetime.utcnow())
+                return
+            elif kind == "result":
+                result = {k: v for k, v in analysis_event.items() if k != "event"}
+                _update_job(
+                    engine, job_id, status='done', progress=1.0, frames_processed=frames_processed,
+                    result=json.dumps(result, ensure_ascii=False), finished_at=datetime.utcnow(),
+                )
+                print(f"Video job {job_id} finished")
+                return
+    except Exception as e:
+        print(f"Video job {job_id} failed: {e}")
+        _update_job(engine, job_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+    finally:
+        if os.path.exists(video_path):
+            os.remove(video_path)
+
+
+def _worker_main(database_uri, classify_fn, alert_fn, stop_event, poll_interval):
+    engine = _create_engine(database_uri)
+    identity = worker_identity(os.getpid())
+    while not stop_event.is_set():
+        try:
+            job = _claim_next_job(engine, identity)
+        except OperationalError as e:
+            print(f"Video job worker {os.getpid()} 無法讀取工作佇列: {e}")
+            job = None
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        _run_job(engine, job, classify_fn, alert_fn)
+
+
+class VideoJobPool:
+    """
+    固定數量的 worker 程序，從資料庫輪詢並執行排隊中的工作。
+
+    classify_fn / alert_fn 必須是模組層級的函式，才能以 spawn 方式傳給子程序。
+    """
+
+    def __init__(self, database_uri, classify_fn, alert_fn, processes=2, poll_interval=0.5):
+        self.database_uri = database_uri
+        self.classify_fn = classify_fn
+        self.alert_fn = alert_fn
+        self.process_count = max(1, processes)
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context('spawn')
+        self._stop_event = self._context.Event()
+        self._processes = []
+
+    @property
+    def running(self):
+        return any(p.is_alive() for p in self._processes)
+
+    def start(self):
+        if self.running:
+            return
+        requeued = requeue_orphaned_jobs(_create_engine(self.database_uri))
+        if requeued:
+            print(f"Requeued {requeued} interrupted video job(s)")
+        self._stop_event.clear()
+        self._processes = [
+            self._context.Process(
+                target=_worker_main,
+                args=(self.database_uri, self.classify_fn, self.alert_fn, self._stop_event, self.poll_interval),
+                name=f'video-job-worker-{i}',
+                daemon=True,
+            )
+            for i in range(self.process_count)
+        ]
+        for process in self._processes:
+            process.start()
+        print(f"Started {self.process_count} video job worker(s)")
+
+    def shutdown(self, timeout=5.0):
+        self._stop_event.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
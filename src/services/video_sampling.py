@@ -0,0 +1,137 @@
+# src/services/video_sampling.py
+# 長影片的自適應抽樣：先以較大間隔跳躍式掃描，只在偵測到黑熊的位置附近加密成每秒一幀，確認連續偵測規則。
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from src.services.image_preprocess import encode_frame
+from src.services.metrics import timed
+
+
+class SeekingFrameReader:
+    """以抽樣序號讀取幀；目標就在目前位置之後不遠時直接 grab() 前進，否則用 CAP_PROP_POS_FRAMES 跳轉。"""
+
+    def __init__(self, cap, frames_to_skip):
+        self.cap = cap
+        self.frames_to_skip = frames_to_skip
+        self.position = 0
+
+    def frame_position(self, sample_index):
+        # 與逐幀抽樣相同：第 k 個抽樣幀是第 (k + 1) * frames_to_skip 幀（從 1 起算）
+        return (sample_index + 1) * self.frames_to_skip - 1
+
+    def read(self, sample_index):
+        target = self.frame_position(sample_index)
+        gap = target - self.position
+        if 0 <= gap <= self.frames_to_skip * 2:
+            for _ in range(gap):
+                if not self.cap.grab():
+                    return None
+        else:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        with timed('frame_decode'):
+            ret, frame = self.cap.read()
+        self.position = target + 1
+        if not ret:
+            return None
+        return encode_frame(frame)
+
+
+class AdaptiveVideoScanner:
+    """
+    粗到細的抽樣掃描。
+
+    classify_fn(image_bytes) 回傳 (detected, confidence)。先每 coarse_step 個抽樣幀檢查一次，
+    命中後往前後逐幀擴展到沒有偵測為止，得到連續偵測區間；
+    任何長度不小於 coarse_step 的區間都一定會被粗掃描命中。
+    單一區間最多擴展到 max_run_frames 幀（預設為 consecutive_frames_needed）：
+    已確認達到警報門檻時不再繼續推論整段有黑熊的畫面，回報的區間長度也以此為上限。
+    """
+
+    def __init__(self, cap, classify_fn, fps, frames_to_skip, frames_to_process_per_second,
+                 consecutive_frames_needed, coarse_step, workers=4, max_run_frames=None):
+        self.reader = SeekingFrameReader(cap, frames_to_skip)
+        self.classify_fn = classify_fn
+        self.fps = fps
+        self.frames_to_process_per_second = frames_to_process_per_second
+        self.consecutive_frames_needed = consecutive_frames_needed
+        self.coarse_step = max(1, coarse_step)
+        self.max_run_frames = max(1, max_run_frames or consecutive_frames_needed)
+        self.workers = max(1, workers)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.sample_count = total_frames // frames_to_skip if total_frames > 0 else 0
+        self.results = {}
+        self.inference_calls = 0
+        # 最近一次產生的區間（起訖抽樣序號）
+        self.last_run = None
+
+    def _evaluate(self, executor, sample_indices):
+        """依序讀取幀後並行推論，回傳依輸入順序排列的 (detected, confidence)。"""
+        futures = {}
+        # 往回擴展時也依遞增順序讀取，盡量用 grab() 前進而不是每幀都跳轉
+        for sample_index in sorted(set(sample_indices)):
+            if sample_index in self.results:
+                continue
+            image_bytes = self.reader.read(sample_index)
+            if image_bytes is None:
+                self.results[sample_index] = (False, 0.0)
+                continue
+            futures[sample_index] = executor.submit(contextvars.copy_context().run, self.classify_fn, image_bytes)
+            self.inference_calls += 1
+        for sample_index, future in futures.items():
+            self.results[sample_index] = future.result()
+        return [self.results[i] for i in sample_indices]
+
+    def _expand(self, executor, sample_index, step, lower, upper, max_frames):
+        """
+        從 sample_index 往 step 方向逐幀擴展（範圍 lower..upper，最多 max_frames 幀），
+        回傳最後一個仍有偵測的抽樣序號。
+        """
+        last = sample_index
+        extended = 0
+        while extended < max_frames:
+            # 只推論還需要的幀數，達到上限時不會多送一整批
+            batch = [last + step * (i + 1) for i in range(min(self.workers, max_frames - extended))]
+            batch = [i for i in batch if lower <= i <= upper]
+            if not batch:
+                return last
+            for i, (detected, _) in zip(batch, self._evaluate(executor, batch)):
+                if not detected:
+                    return last
+                last = i
+                extended += 1
+        return last
+
+    def _interval(self, first, last):
+        run = last - first + 1
+        return {
+            "start_seconds": round(self.reader.frame_position(first) / self.fps, 2),
+            "end_seconds": round(self.reader.frame_position(last) / self.fps, 2),
+            "duration_seconds": round(run / self.frames_to_process_per_second, 2),
+            "max_confidence": max(self.results[i][1] for i in range(first, last + 1)),
+            "frames": run,
+        }
+
+    def iter_intervals(self):
+        """依時間順序產生連續偵測區間；呼叫端可在達到警報門檻時停止迭代。"""
+        covered_until = -1
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='adaptive-inference') as executor:
+            coarse = list(range(0, self.sample_count, self.coarse_step))
+            for start in range(0, len(coarse), self.workers):
+                batch = [i for i in coarse[start:start + self.workers] if i > covered_until]
+                for sample_index, (detected, _) in zip(batch, self._evaluate(executor, batch)):
+                    if not detected or sample_index <= covered_until:
+                        continue
+                    # 往前不跨進上一個區間，前後合計不超過 max_run_frames 幀
+                    first = self._expand(
+                        executor, sample_index, -1, covered_until + 1, sample_index, self.max_run_frames - 1
+                    )
+                    last = self._expand(
+                        executor, sample_index, 1, sample_index, self.sample_count - 1,
+                        self.max_run_frames - (sample_index - first + 1),
+                    )
+                    covered_until = last
+                    self.last_run = (first, last)
+                    yield self._interval(first, last)
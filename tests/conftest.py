@@ -0,0 +1,9 @@
+# tests/conftest.py
+# 讓 `pytest` 從任何目錄執行時都能匯入 src 與 benchmarks 套件。
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
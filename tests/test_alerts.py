@@ -0,0 +1,93 @@
+# tests/test_alerts.py
+
+import threading
+import time
+
+import pytest
+
+from benchmarks.fake_servers import FakeTelegramServer
+from src.services.alerts import AlertDispatcher, TelegramBot
+
+
+@pytest.fixture
+def telegram():
+    server = FakeTelegramServer(latency=0.0).start()
+    yield server
+    server.stop()
+
+
+class Recorder:
+    """以 Telegram 替身發送警報，並記錄每次成功發送的時間與內容。"""
+
+    def __init__(self, telegram):
+        self.bot = TelegramBot('test-token', '1', api_base=telegram.url)
+        self.delivered = []
+        self._lock = threading.Lock()
+
+    def __call__(self, alert):
+        self.bot.send_message(f"{alert.source} {alert.confidence:.2f} {alert.coalesced} {alert.detection_count or 0}")
+        with self._lock:
+            self.delivered.append((time.monotonic(), alert))
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_alerts_within_window_are_coalesced(telegram):
+    recorder = Recorder(telegram)
+    dispatcher = AlertDispatcher(recorder, window=0.5, rate_per_minute=60, max_retries=0)
+    try:
+        for confidence in (0.8, 0.95, 0.7, 0.9, 0.85):
+            dispatcher.submit('cam-1', confidence)
+        dispatcher.submit('cam-2', 0.75)
+
+        assert wait_for(lambda: len(recorder.delivered) == 3)
+        first, other, summary = (alert for _, alert in recorder.delivered)
+        assert (first.source, first.coalesced, first.confidence) == ('cam-1', 0, 0.8)
+        assert (other.source, other.coalesced) == ('cam-2', 0)
+        assert (summary.source, summary.coalesced, summary.detection_count) == ('cam-1', 4, 4)
+        assert summary.confidence == 0.95
+        assert dispatcher.stats()['coalesced'] == 4
+        # 摘要在時間窗結束時才送出
+        assert recorder.delivered[2][0] - recorder.delivered[0][0] >= 0.4
+    finally:
+        dispatcher.shutdown()
+    assert len(telegram.messages) == 3
+
+
+def test_token_bucket_limits_send_rate(telegram):
+    recorder = Recorder(telegram)
+    # 每分鐘 120 則：桶子一開始有 120 個令牌，之後每 0.5 秒補一個，第 123 則最快在 1.5 秒後送出
+    started = time.monotonic()
+    dispatcher = AlertDispatcher(recorder, window=0, rate_per_minute=120, max_retries=0)
+    try:
+        for i in range(123):
+            dispatcher.submit(f'source-{i}', 0.9)
+        assert wait_for(lambda: len(recorder.delivered) == 123)
+    finally:
+        dispatcher.shutdown()
+
+    assert recorder.delivered[-1][0] - started >= 1.4
+
+
+def test_telegram_429_waits_for_retry_after(telegram):
+    recorder = Recorder(telegram)
+    telegram.scripted = [(429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}})]
+    dispatcher = AlertDispatcher(recorder, window=0, rate_per_minute=60, max_retries=2, backoff_max=5)
+    try:
+        submitted_at = time.monotonic()
+        dispatcher.submit('cam-1', 0.9)
+        assert wait_for(lambda: dispatcher.stats()['sent'] == 1)
+    finally:
+        dispatcher.shutdown()
+
+    assert telegram.requests == 2
+    assert len(telegram.messages) == 1
+    assert recorder.delivered[0][0] - submitted_at >= 0.9
+    assert dispatcher.stats()['failed'] == 0
@@ -0,0 +1,109 @@
+# tests/test_api.py
+# 以真正的 werkzeug 伺服器執行 app：串流回應在請求結束後才產生內容，test_client 測不出這類問題。
+
+import io
+import json
+import os
+import tempfile
+import threading
+
+import pytest
+import requests
+from werkzeug.serving import make_server
+from werkzeug.test import EnvironBuilder
+
+from benchmarks.fake_servers import FakeModelServer, FakeTelegramServer
+from benchmarks.media import make_image, make_video
+
+
+@pytest.fixture(scope='module')
+def backend(tmp_path_factory):
+    model = FakeModelServer(latency=0.0).start()
+    telegram = FakeTelegramServer(latency=0.0).start()
+    workdir = tmp_path_factory.mktemp('app')
+    # 必須在匯入 app 之前設定，讓 app 連到替身伺服器並使用暫存資料庫
+    os.environ.update({
+        'HF_API_URL': model.predict_url,
+        'HF_API_TOKEN': 'test',
+        'DETECTOR_BACKENDS': 'hf',
+        'TELEGRAM_BOT_TOKEN': 'test',
+        'TELEGRAM_CHAT_ID': '1',
+        'TELEGRAM_API_BASE': telegram.url,
+        'DETECTION_CACHE_ENABLED': '0',
+        'DATABASE_PATH': str(workdir / 'test.db'),
+        'VIDEO_JOB_DIR': str(workdir / 'video_jobs'),
+    })
+    import src.main as backend
+    yield backend
+    if backend.alert_dispatcher is not None:
+        backend.alert_dispatcher.shutdown()
+    model.stop()
+    telegram.stop()
+
+
+@pytest.fixture(scope='module')
+def server(backend):
+    server = make_server('127.0.0.1', 0, backend.create_app(warm_start=False), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def upload_images(count):
+    return [('images', (f"{i}.jpg", make_image(64, 48, seed=i), 'image/jpeg')) for i in range(count)]
+
+
+def test_batch_detection_streams_multipart_uploads(server):
+    response = requests.post(f"{server}/api/detect_batch", params={'stream': 'ndjson'}, files=upload_images(3), timeout=10)
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    images = [e for e in events if e['event'] == 'image']
+    assert sorted(e['filename'] for e in images) == ['0.jpg', '1.jpg', '2.jpg']
+    assert all(e['success'] for e in images)
+    assert events[-1]['event'] == 'summary' and events[-1]['total'] == 3
+
+
+def test_batch_detection_json_response(server):
+    response = requests.post(f"{server}/api/detect_batch", files=upload_images(2), timeout=10)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body['success'] and body['total'] == 2
+
+
+def test_requests_do_not_start_video_job_workers(backend, server, tmp_path):
+    # gunicorn 的每個 worker 都會處理請求；worker 程序只能由 __main__、VIDEO_JOBS_IN_APP 或 video-workers 啟動
+    video = make_video(str(tmp_path / 'clip.avi'), 2, 5, width=64, height=48)
+    with open(video, 'rb') as f:
+        response = requests.post(f"{server}/api/analyze_video", data={'async': '1'}, files={'video': f}, timeout=10)
+    assert response.status_code == 202
+    status = requests.get(f"{server}{response.json()['status_url']}", timeout=10)
+
+    assert status.json()['job']['status'] == 'queued'
+    assert requests.get(f"{server}/api/jobs/missing", timeout=10).status_code == 404
+    assert not backend.video_job_pool.running
+
+
+def ndjson_upload(path, tmp_path):
+    if path == '/api/analyze_video':
+        return {'video': open(make_video(str(tmp_path / 'clip.avi'), 2, 5, width=64, height=48), 'rb')}
+    return {'images': [(io.BytesIO(content), name) for _, (name, content, _) in upload_images(2)]}
+
+
+@pytest.mark.parametrize('path', ['/api/detect_batch', '/api/analyze_video'])
+def test_ndjson_temp_files_removed_when_client_disconnects_early(backend, monkeypatch, tmp_path, path):
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    data = {'stream': 'ndjson', **ndjson_upload(path, tmp_path)}
+    monkeypatch.setattr(tempfile, 'tempdir', str(uploads))
+    # test_client 會先讀出第一行，這裡直接呼叫 WSGI app 才能模擬在第一行之前斷線
+    app = backend.create_app(warm_start=False)
+    statuses = []
+    app_iter = app.wsgi_app(EnvironBuilder(path=path, method='POST', data=data).get_environ(),
+                            lambda status, headers: statuses.append(status))
+    assert statuses == ['200 OK'] and os.listdir(uploads)
+
+    app_iter.close()
+    assert os.listdir(uploads) == []
@@ -0,0 +1,21 @@
+# tests/test_batch_detection.py
+
+import zipfile
+
+from benchmarks.media import make_image
+from src.services.batch_detection import iter_zip_images
+
+
+def test_zip_members_over_the_size_cap_are_skipped(tmp_path):
+    path = tmp_path / 'upload.zip'
+    image = make_image(64, 48)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('small.jpg', image)
+        # 壓縮後只有幾十 KB，解壓後 64 MB
+        archive.writestr('bomb.jpg', bytes(64 * 1024 * 1024))
+        archive.writestr('notes.txt', b'not an image')
+
+    images = list(iter_zip_images(str(path), max_image_bytes=1024 * 1024))
+
+    assert images == [('small.jpg', image)]
+    assert path.stat().st_size < 1024 * 1024
@@ -0,0 +1,52 @@
+# tests/test_image_preprocess.py
+
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from benchmarks.media import make_image
+from src.services.image_preprocess import annotated_thumbnail, prepare_image
+
+
+def _size(data):
+    return Image.open(io.BytesIO(data)).size
+
+
+@pytest.mark.parametrize('side', [1280, 2560])
+def test_large_jpeg_is_downsized(side):
+    original = make_image(side, side)
+    prepared = prepare_image(original, max_side=640)
+
+    assert _size(prepared.data) == (640, 640)
+    assert prepared.original_size == (side, side)
+    assert prepared.size == (640, 640)
+    assert prepared.bytes_saved > 0
+
+
+def test_small_upright_jpeg_is_passed_through():
+    original = make_image(400, 300)
+    prepared = prepare_image(original, max_side=640)
+
+    assert prepared.data == original
+    assert prepared.bytes_saved == 0
+    assert prepared.size == (400, 300)
+
+
+def _red_columns(image, row):
+    return [x for x in range(image.width) if image.getpixel((x, row))[0] > 200 and image.getpixel((x, row))[1] < 120]
+
+
+def test_thumbnail_boxes_use_model_image_coordinates():
+    buffer = io.BytesIO()
+    Image.new('RGB', (1280, 1280), (128, 128, 128)).save(buffer, format='JPEG')
+    prepared = prepare_image(buffer.getvalue(), max_side=640)
+
+    # 送給模型的是 640x640 的影像，框住左上四分之一
+    detections = [{'label': 'kumay', 'confidence': 0.9, 'box': [0, 0, 320, 320]}]
+    thumbnail = Image.open(io.BytesIO(base64.b64decode(annotated_thumbnail(prepared, detections, max_side=320))))
+
+    assert thumbnail.size == (320, 320)
+    columns = _red_columns(thumbnail.convert('RGB'), 120)
+    assert columns and 150 <= max(columns) <= 165
@@ -0,0 +1,77 @@
+# tests/test_inference_client.py
+
+import time
+
+import pytest
+import requests
+
+from benchmarks.fake_servers import FakeModelServer
+from src.services.inference_client import CircuitBreaker, CircuitOpenError, InferenceClient
+
+RESET_TIMEOUT = 0.2
+
+
+@pytest.fixture
+def model():
+    server = FakeModelServer(latency=0.0, response='bear').start()
+    yield server
+    server.stop()
+
+
+def make_client(model, max_retries=0, failure_threshold=2):
+    return InferenceClient(
+        api_url=model.predict_url, api_token='test', connect_timeout=2, read_timeout=2,
+        max_retries=max_retries, backoff_base=0.01, backoff_max=0.05,
+        breaker=CircuitBreaker(failure_threshold, RESET_TIMEOUT),
+    )
+
+
+def open_breaker(client, model):
+    model.error_rate = 1.0
+    for _ in range(client.breaker.failure_threshold):
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.predict(b'image')
+    model.error_rate = 0.0
+    assert client.breaker.state == 'open'
+
+
+def test_retries_server_errors_then_succeeds(model):
+    client = make_client(model, max_retries=2)
+    model.scripted = ['error', 'error']
+
+    result = client.predict(b'image')
+
+    assert result['detections'][0]['label'] == 'kumay'
+    assert model.requests == 3
+    assert client.breaker.state == 'closed'
+
+
+def test_breaker_opens_fails_fast_and_recovers(model):
+    client = make_client(model)
+    open_breaker(client, model)
+    requests_before = model.requests
+
+    with pytest.raises(CircuitOpenError):
+        client.predict(b'image')
+    assert model.requests == requests_before
+
+    time.sleep(RESET_TIMEOUT)
+    assert client.breaker.state == 'half-open'
+    assert client.predict(b'image')['detections']
+    assert client.breaker.state == 'closed'
+
+
+def test_half_open_trial_interrupted_response_does_not_wedge_breaker(model):
+    client = make_client(model)
+    open_breaker(client, model)
+    time.sleep(RESET_TIMEOUT)
+
+    model.scripted = ['truncated']
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.predict(b'image')
+    # 試探失敗後重新開啟，等待後可以再試探並恢復
+    assert client.breaker.state == 'open'
+
+    time.sleep(RESET_TIMEOUT)
+    assert client.predict(b'image')['detections']
+    assert client.breaker.state == 'closed'
@@ -0,0 +1,74 @@
+# tests/test_video_analysis.py
+
+import cv2
+import numpy as np
+import pytest
+
+from src.services.video_analysis import analyze_video_events
+
+FPS = 10
+OBJECT = (300, 160, 40)  # x, y, 邊長（px）
+
+
+def detect_object(image_bytes):
+    """物體所在區域偏紅時視為偵測到黑熊。"""
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    x, y, size = OBJECT
+    blue, green, red = image[y:y + size, x:x + size].reshape(-1, 3).mean(axis=0)
+    return bool(red - max(blue, green) > 100), 0.9
+
+
+@pytest.fixture(scope='module')
+def static_clip(tmp_path_factory):
+    # 靜止的畫面，40x40 的物體只在 5 秒到 12 秒之間出現
+    path = str(tmp_path_factory.mktemp('video') / 'static.avi')
+    rng = np.random.default_rng(0)
+    background = cv2.resize(rng.integers(60, 120, (46, 81, 3), dtype=np.uint8), (640, 360))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), FPS, (640, 360))
+    x, y, size = OBJECT
+    for i in range(20 * FPS):
+        frame = background.copy()
+        if 5 * FPS <= i < 12 * FPS:
+            cv2.rectangle(frame, (x, y), (x + size - 1, y + size - 1), (0, 0, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def frame_results(path, **options):
+    alerts = []
+    events = list(analyze_video_events(path, detect_object, alerts.append, workers=2, **options))
+    frames = [(e['time_seconds'], e['detected']) for e in events if e['event'] == 'frame']
+    return frames, alerts, events[-1]
+
+
+@pytest.mark.parametrize('motion_threshold', [0.0, 10.0])
+def test_small_object_in_static_scene(static_clip, motion_threshold):
+    frames, alerts, result = frame_results(static_clip, motion_threshold=motion_threshold)
+
+    # 物體出現後的第三個抽樣幀（7.9 秒）觸發警報，與逐幀推論的結果相同
+    detected = [t for t, d in frames if d]
+    assert detected == [5.9, 6.9, 7.9]
+    assert all(not d for t, d in frames if t < 5.9)
+    assert len(alerts) == 1 and result['alert_sent']
+    if motion_threshold:
+        assert result['inference_calls_saved'] > 0
+    else:
+        assert result['inference_calls_saved'] == 0
+
+
+def test_motion_gating_does_not_reuse_results_after_object_leaves(static_clip):
+    # 把警報門檻拉高到不會觸發，檢查整支影片每個抽樣幀的結果
+    from src.services import video_analysis
+
+    original = video_analysis.ALERT_THRESHOLD_SECONDS
+    video_analysis.ALERT_THRESHOLD_SECONDS = 60
+    try:
+        gated, _, gated_result = frame_results(static_clip, motion_threshold=10.0)
+        serial, _, _ = frame_results(static_clip, motion_threshold=0.0)
+    finally:
+        video_analysis.ALERT_THRESHOLD_SECONDS = original
+
+    assert gated == serial
+    assert [t for t, d in serial if d] == [5.9, 6.9, 7.9, 8.9, 9.9, 10.9, 11.9]
+    assert gated_result['inference_calls'] < len(gated)
@@ -0,0 +1,66 @@
+# tests/test_video_jobs.py
+
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import insert, select, text
+
+from src.models.video_job import VideoJob
+from src.services.video_jobs import _create_engine, requeue_orphaned_jobs, upgrade_schema, worker_identity
+
+pytestmark = pytest.mark.skipif(worker_identity(os.getpid()) is None, reason="需要 Linux 的 /proc")
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = _create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    VideoJob.__table__.create(engine)
+    return engine
+
+
+def add_running_job(engine, job_id, pid, worker_id):
+    with engine.begin() as conn:
+        conn.execute(insert(VideoJob).values(
+            id=job_id, status='running', video_path='/tmp/x.mp4', options='{}', worker_pid=pid, worker_id=worker_id,
+        ))
+
+
+def statuses(engine):
+    with engine.begin() as conn:
+        return dict(conn.execute(select(VideoJob.id, VideoJob.status)).all())
+
+
+def test_requeues_jobs_whose_pid_was_reused(engine):
+    pid = os.getpid()
+    add_running_job(engine, 'alive', pid, worker_identity(pid))
+    # 重啟前的 worker 剛好和現在的程序同一個 PID，但啟動時間不同
+    boot_id, _, started = worker_identity(pid).split(':')
+    add_running_job(engine, 'reused-pid', pid, f"{boot_id}:{pid}:{int(started) - 1}")
+    add_running_job(engine, 'other-boot', pid, f"00000000-0000-0000-0000-000000000000:{pid}:{started}")
+
+    assert requeue_orphaned_jobs(engine) == 2
+    assert statuses(engine) == {'alive': 'running', 'reused-pid': 'queued', 'other-boot': 'queued'}
+
+
+def test_requeues_jobs_of_dead_workers(engine):
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    add_running_job(engine, 'dead', process.pid, None)
+    add_running_job(engine, 'no-pid', None, None)
+
+    assert requeue_orphaned_jobs(engine) == 2
+
+
+def test_upgrade_schema_adds_worker_id_column(tmp_path):
+    engine = _create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE video_job (id VARCHAR(32) PRIMARY KEY, status VARCHAR(16), worker_pid INTEGER)"))
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    with engine.begin() as conn:
+        columns = [row[1] for row in conn.execute(text("PRAGMA table_info(video_job)"))]
+    assert 'worker_id' in columns
@@ -0,0 +1,62 @@
+# tests/test_video_sampling.py
+
+import threading
+
+import pytest
+
+from benchmarks.media import make_video
+from src.services.video_analysis import analyze_video_events
+
+
+class CountingClassifier:
+    """每一幀都回報同樣的結果（預設為偵測到黑熊），並計算推論次數。"""
+
+    def __init__(self, detected=True):
+        self.detected = detected
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, image_bytes):
+        with self._lock:
+            self.calls += 1
+        return self.detected, 0.9 if self.detected else 0.0
+
+
+def run(path, classify_fn, **options):
+    alerts = []
+    events = list(analyze_video_events(path, classify_fn, alerts.append, **options))
+    return events[-1], alerts
+
+
+@pytest.fixture(scope='module')
+def long_video(tmp_path_factory):
+    # 600 秒、1 fps，每一幀都視為有黑熊
+    return make_video(str(tmp_path_factory.mktemp('video') / 'all_bear.avi'), 600, 1, width=64, height=48)
+
+
+def test_adaptive_all_positive_stops_after_alert_threshold(long_video):
+    linear = CountingClassifier()
+    linear_result, linear_alerts = run(long_video, linear, sampling='linear', workers=1)
+    adaptive = CountingClassifier()
+    adaptive_result, adaptive_alerts = run(long_video, adaptive, sampling='adaptive', workers=4)
+
+    assert linear_result['alert_sent'] and adaptive_result['alert_sent']
+    assert len(linear_alerts) == len(adaptive_alerts) == 1
+    assert linear.calls == 3
+    # 粗掃描一批（workers 幀）加上確認連續偵測所需的幀數，而不是整支影片
+    assert adaptive.calls <= 4 + 3
+    assert adaptive_result['inference_calls'] == adaptive.calls
+    assert adaptive_result['detection_intervals'][0]['frames'] == 3
+    # 逐幀抽樣只需 3 次就觸發警報，自適應抽樣沒有省下任何推論
+    assert adaptive_result['inference_calls_saved'] == 0
+
+
+def test_adaptive_savings_compare_with_linear_calls(long_video):
+    linear = CountingClassifier(detected=False)
+    linear_result, _ = run(long_video, linear, sampling='linear', workers=1)
+    adaptive = CountingClassifier(detected=False)
+    adaptive_result, _ = run(long_video, adaptive, sampling='adaptive', workers=4)
+
+    assert linear.calls == 600
+    assert adaptive_result['inference_calls'] == adaptive.calls == 200
+    assert adaptive_result['inference_calls_saved'] == linear.calls - adaptive.calls